@@ -0,0 +1,52 @@
+"""
+Shared fixtures for the benchmarks.
+
+Every benchmark runs against one database in a scratch working directory (the
+database lives at the relative path accounts.db, and is created when the
+database module is imported, so the directory is changed before any test module
+is collected), with share prices mocked so nothing goes to the network. Sizes
+are configurable through environment variables so the slow cases can be scaled
+down for a quick run:
+
+    BENCH_DIR            directory to run in; reusing one keeps the seeded logs (a new temporary one)
+    BENCH_TRANSACTIONS   account history sizes, comma-separated (10,1000,100000)
+    BENCH_LOG_ROWS       rows in the logs table for read_log (10000000)
+    BENCH_MARKET_TICKERS tickers in a day of market bars (10000)
+
+Run with `make bench`, which writes benchmark.json for comparing versions.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+# Add the src directory to the Python path
+src_path = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_path))
+
+TRANSACTION_COUNTS = [int(n) for n in os.getenv("BENCH_TRANSACTIONS", "10,1000,100000").split(",")]
+LOG_ROWS = int(os.getenv("BENCH_LOG_ROWS", "10000000"))
+MARKET_TICKERS = int(os.getenv("BENCH_MARKET_TICKERS", "10000"))
+
+SHARE_PRICE = 100.0
+
+# The models are mocked, but the trader module creates its API clients on import
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+BENCH_DIR = os.environ.setdefault("BENCH_DIR", tempfile.mkdtemp(prefix="ai-stock-trader-bench-"))
+os.makedirs(BENCH_DIR, exist_ok=True)
+os.chdir(BENCH_DIR)
+
+
+@pytest.fixture(autouse=True)
+def mock_prices():
+    """Price every symbol at SHARE_PRICE and leave reports uncached."""
+    with patch("ai_stock_trader.accounts.account.get_share_price", return_value=SHARE_PRICE), \
+         patch("ai_stock_trader.accounts.account.get_share_prices",
+               side_effect=lambda symbols: {symbol: SHARE_PRICE for symbol in symbols}), \
+         patch("ai_stock_trader.accounts.account.get_price_epoch", return_value=None):
+        yield
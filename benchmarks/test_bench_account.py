@@ -0,0 +1,93 @@
+"""
+Benchmarks for Account operations as an account's history grows.
+"""
+
+import os
+
+import pytest
+
+from ai_stock_trader.accounts.account import Account
+from ai_stock_trader.utils.database import write_account, read_account
+
+from conftest import TRANSACTION_COUNTS
+
+SYMBOLS = ["AAPL", "MSFT", "NVDA", "AMZN", "GOOG"]
+SEED_QUANTITY = 10_000_000
+# Trades add to the history, so each timed trade gets a freshly seeded account
+TRADE_ROUNDS = int(os.getenv("BENCH_TRADE_ROUNDS", "10"))
+
+
+def seed_account(name: str, transactions: int) -> None:
+    """Store an account with the given number of transactions, holding plenty of every symbol."""
+    history = [
+        {
+            "symbol": symbol,
+            "quantity": SEED_QUANTITY,
+            "price": 1.0,
+            "timestamp": "2024-01-01 09:30:00",
+            "rationale": "Seed position",
+        }
+        for symbol in SYMBOLS
+    ]
+    for i in range(transactions - len(history)):
+        history.append({
+            "symbol": SYMBOLS[i % len(SYMBOLS)],
+            "quantity": 1 if (i // len(SYMBOLS)) % 2 == 0 else -1,
+            "price": 100.0,
+            "timestamp": "2024-01-02 10:00:00",
+            "rationale": "Benchmark trade with a rationale of a typical length for the traders",
+        })
+    holdings = {symbol: 0 for symbol in SYMBOLS}
+    for transaction in history:
+        holdings[transaction["symbol"]] += transaction["quantity"]
+    write_account(name, {
+        "name": name,
+        "balance": 1e12,
+        "strategy": "Benchmark",
+        "holdings": holdings,
+        "transactions": history,
+        "portfolio_value_time_series": [],
+    })
+
+
+@pytest.fixture(params=TRANSACTION_COUNTS, ids=lambda n: f"{n}tx")
+def transactions(request):
+    return request.param
+
+
+@pytest.fixture
+def account(transactions):
+    name = f"bench_{transactions}"
+    if not read_account(name):
+        seed_account(name, transactions)
+    return Account.get(name)
+
+
+def fresh_account(transactions: int):
+    name = f"bench_trade_{transactions}"
+    seed_account(name, transactions)
+    return (Account.get(name),), {}
+
+
+def test_get(benchmark, account):
+    benchmark(Account.get, account.name)
+
+
+def test_buy_shares(benchmark, transactions):
+    benchmark.pedantic(
+        lambda account: account.buy_shares("AAPL", 1, "Benchmark buy"),
+        setup=lambda: fresh_account(transactions),
+        rounds=TRADE_ROUNDS,
+    )
+
+
+def test_sell_shares(benchmark, transactions):
+    benchmark.pedantic(
+        lambda account: account.sell_shares("AAPL", 1, "Benchmark sell"),
+        setup=lambda: fresh_account(transactions),
+        rounds=TRADE_ROUNDS,
+    )
+
+
+def test_report(benchmark, account):
+    benchmark(account.report)
@@ -0,0 +1,47 @@
+"""
+Benchmarks for an accounts tool call, through the MCP server and in process.
+"""
+
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+from mcp import StdioServerParameters
+
+from ai_stock_trader.accounts.client import AccountsClient, params
+from ai_stock_trader.accounts.service import account_service
+
+ACCOUNT = "bench_mcp"
+SERVER = Path(__file__).parent.parent / "src" / "ai_stock_trader" / "accounts" / "server.py"
+
+
+@pytest.fixture(scope="module")
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="module")
+def accounts_client(loop):
+    """One accounts server and session for the module, as the trading floor keeps them."""
+    # The trading floor's server command, run in the benchmark directory so it shares its database
+    client = AccountsClient(StdioServerParameters(command=params.command, args=["run", str(SERVER)], cwd=os.getcwd()))
+    loop.run_until_complete(client.list_tools())
+    yield client
+    loop.run_until_complete(client.close())
+
+
+def test_mcp_tool_round_trip(benchmark, loop, accounts_client):
+    benchmark(lambda: loop.run_until_complete(accounts_client.call_tool("get_balance", {"name": ACCOUNT})))
+
+
+def test_mcp_resource_round_trip(benchmark, loop, accounts_client):
+    benchmark(lambda: loop.run_until_complete(
+        accounts_client.read_resource(f"accounts://accounts_server/{ACCOUNT}")
+    ))
+
+
+def test_inprocess_call(benchmark, loop):
+    benchmark(lambda: loop.run_until_complete(account_service.call("get_balance", ACCOUNT)))
@@ -0,0 +1,122 @@
+"""
+Benchmark of a whole trading cycle with the models and share prices mocked.
+
+Each trader's model asks for a buy on its first turn and signs off once the tool
+result comes back, so a cycle exercises everything around the model: the
+scheduler, building each agent and its prompt from the account service, the
+agents SDK's turn loop and the buy going through the accounts tools. Set
+BENCH_MODEL_LATENCY (seconds per model call) to see how the floor overlaps slow
+models.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import pytest
+from agents import OpenAIChatCompletionsModel, set_tracing_disabled
+from agents.mcp import MCPServer
+from mcp.types import CallToolResult, GetPromptResult, ListPromptsResult, TextContent
+from openai.types.chat import ChatCompletion
+
+from ai_stock_trader.accounts.client import list_accounts_tools, call_accounts_tool
+from ai_stock_trader.core.scheduler import TradingScheduler
+from ai_stock_trader.core.trader import Trader
+
+MODEL_LATENCY = float(os.getenv("BENCH_MODEL_LATENCY", "0"))
+TRADERS = [("Warren", "Patience"), ("George", "Bold"), ("Ray", "Systematic"), ("Cathie", "Crypto")]
+
+
+def completion(message: dict) -> ChatCompletion:
+    return ChatCompletion.model_validate({
+        "id": "bench",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "bench",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+    })
+
+
+class ScriptedCompletions:
+    """Buy one share on the first turn, then reply with an appraisal."""
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(MODEL_LATENCY)
+        messages = kwargs["messages"]
+        if any(message["role"] == "tool" for message in messages):
+            return completion({"role": "assistant", "content": "Bought one share of AAPL."})
+        name = re.search(r"You are (\w+), a trader", messages[0]["content"]).group(1)
+        arguments = {"name": name, "symbol": "AAPL", "quantity": 1, "rationale": "Benchmark"}
+        return completion({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": "call_buy",
+                "type": "function",
+                "function": {"name": "buy_shares", "arguments": json.dumps(arguments)},
+            }],
+        })
+
+
+class ScriptedClient:
+    base_url = "http://bench"
+
+    def __init__(self):
+        self.chat = type("Chat", (), {"completions": ScriptedCompletions()})()
+
+
+class InProcessAccountsServer(MCPServer):
+    """The accounts tools served in process, standing in for the accounts MCP server."""
+
+    name = "accounts"
+
+    async def connect(self):
+        pass
+
+    async def cleanup(self):
+        pass
+
+    async def list_tools(self, run_context=None, agent=None):
+        return await list_accounts_tools()
+
+    async def call_tool(self, tool_name, arguments, meta=None):
+        result = await call_accounts_tool(tool_name, arguments)
+        return CallToolResult(content=[TextContent(type="text", text=json.dumps(result))])
+
+    async def list_prompts(self):
+        return ListPromptsResult(prompts=[])
+
+    async def get_prompt(self, name, arguments=None):
+        return GetPromptResult(messages=[])
+
+
+class InProcessPool:
+    """Leases the in-process accounts tools, and no research servers, to every trader."""
+
+    def __init__(self):
+        self.accounts_server = InProcessAccountsServer()
+
+    @asynccontextmanager
+    async def lease(self, name):
+        yield [self.accounts_server], []
+
+
+@pytest.fixture(scope="module")
+def loop():
+    set_tracing_disabled(True)
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+def test_trading_cycle(benchmark, loop):
+    traders = [Trader(name, lastname, "bench-model") for name, lastname in TRADERS]
+    scheduler = TradingScheduler(traders, interval=0, stagger=0)
+    pool = InProcessPool()
+    model = OpenAIChatCompletionsModel(model="bench-model", openai_client=ScriptedClient())
+    with patch("ai_stock_trader.core.trader.get_model", return_value=model):
+        benchmark(lambda: loop.run_until_complete(scheduler.run_cycle(pool)))
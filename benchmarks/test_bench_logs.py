@@ -0,0 +1,55 @@
+"""
+Benchmarks for writing and reading the logs table.
+"""
+
+import pytest
+
+from ai_stock_trader.utils.database import get_connection, transaction, write_log, read_log, read_log_since
+from ai_stock_trader.utils.tracers import LogWriter
+
+from conftest import LOG_ROWS
+
+LOG_BATCH = 1_000
+
+
+@pytest.fixture(scope="module")
+def big_logs():
+    """Fill the logs table up to LOG_ROWS entries, unless an earlier run in BENCH_DIR already did."""
+    existing = get_connection().execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    if existing < LOG_ROWS:
+        # Four traders' entries interleaved, the way a trading floor writes them
+        with transaction() as conn:
+            conn.execute('''
+                WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < ?)
+                INSERT INTO logs (name, datetime, type, message)
+                SELECT CASE x % 4 WHEN 0 THEN 'warren' WHEN 1 THEN 'george' WHEN 2 THEN 'ray' ELSE 'cathie' END,
+                    datetime('now'), 'trace', 'Benchmark log entry ' || x
+                FROM seq
+            ''', (LOG_ROWS - existing,))
+    return "warren"
+
+
+def test_write_log(benchmark):
+    benchmark(write_log, "bench", "trace", "Benchmark log entry")
+
+
+def test_log_writer_throughput(benchmark):
+    """Entries per round through the batching writer, including the flush to the database."""
+    writer = LogWriter()
+
+    def write_batch():
+        for _ in range(LOG_BATCH):
+            writer.write("bench", "trace", "Benchmark log entry")
+        writer.flush()
+
+    benchmark(write_batch)
+    writer.shutdown()
+
+
+def test_read_log(benchmark, big_logs):
+    benchmark(lambda: list(read_log(big_logs, last_n=10)))
+
+
+def test_read_log_since(benchmark, big_logs):
+    newest = get_connection().execute("SELECT MAX(id) FROM logs").fetchone()[0]
+    benchmark(read_log_since, big_logs, newest - 100, 10)
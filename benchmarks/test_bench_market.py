@@ -0,0 +1,60 @@
+"""
+Benchmarks for loading a day of end-of-day market bars, with the Polygon fetch mocked.
+"""
+
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from ai_stock_trader.market import market_data
+from ai_stock_trader.utils.database import get_connection
+
+from conftest import MARKET_TICKERS
+
+BENCH_DATE = "2024-01-02"
+
+
+@pytest.fixture(autouse=True)
+def mock_polygon():
+    bars = [
+        (f"T{i:05d}", 100.0, 101.0, 99.0, 100.5, 1_000_000.0)
+        for i in range(MARKET_TICKERS)
+    ]
+    with patch.object(market_data, "get_all_share_bars_polygon_eod", return_value=bars):
+        yield
+
+
+def forget_market(keep_stored: bool = False):
+    market_data.load_market_for_prior_date.cache_clear()
+    if not keep_stored:
+        get_connection().execute("DELETE FROM market_prices WHERE date = ?", (BENCH_DATE,))
+    return (BENCH_DATE,), {}
+
+
+def test_load_market_cold(benchmark):
+    """First load of the day: fetch and store every ticker's bar."""
+    benchmark.pedantic(market_data.load_market_for_prior_date, setup=forget_market, rounds=10)
+
+
+def test_load_market_stored(benchmark):
+    """A fresh process on a day that is already stored: one existence check."""
+    market_data.load_market_for_prior_date(BENCH_DATE)
+    benchmark.pedantic(
+        market_data.load_market_for_prior_date,
+        setup=lambda: forget_market(keep_stored=True),
+        rounds=100,
+    )
+
+
+def test_load_market_warm(benchmark):
+    """Every later call in the same process."""
+    market_data.load_market_for_prior_date(BENCH_DATE)
+    benchmark(market_data.load_market_for_prior_date, BENCH_DATE)
+
+
+def test_eod_prices_for_a_portfolio(benchmark):
+    today = datetime.now().date().strftime("%Y-%m-%d")
+    market_data.load_market_for_prior_date(today)
+    symbols = [f"T{i:05d}" for i in range(0, MARKET_TICKERS, max(1, MARKET_TICKERS // 10))]
+    benchmark(market_data.get_share_prices_polygon_eod, symbols)
@@ -18,9 +18,9 @@ def main():
     parser = argparse.ArgumentParser(description="AI Stock Market Trader")
     parser.add_argument(
         "--mode",
-        choices=["web", "trading"],
+        choices=["web", "trading", "compact-logs"],
         default="web",
-        help="Run mode: web (Gradio interface) or trading (trading floor)"
+        help="Run mode: web (Gradio interface), trading (trading floor) or compact-logs (archive old logs)"
     )
     
     args = parser.parse_args()
@@ -39,6 +39,10 @@ def main():
             await trading_floor.run()
         
         asyncio.run(run_trading())
+    elif args.mode == "compact-logs":
+        print("Compacting AI Stock Trader logs...")
+        from ai_stock_trader.utils.retention import compact_logs
+        print(f"Archived {compact_logs()} log rows")
 
 if __name__ == "__main__":
     main()
@@ -26,6 +26,12 @@ def run_web_app():
     main()
 
 
+def run_log_compaction():
+    """Archive and prune the logs table once."""
+    from ai_stock_trader.utils.retention import compact_logs
+    print(f"Archived {compact_logs()} log rows")
+
+
 def main_cli():
     """Main CLI entry point."""
     import argparse
@@ -33,9 +39,9 @@ def main_cli():
     parser = argparse.ArgumentParser(description="AI Stock Market Trader")
     parser.add_argument(
         "--mode",
-        choices=["web", "trading"],
+        choices=["web", "trading", "compact-logs"],
         default="web",
-        help="Run mode: web (Gradio interface) or trading (trading floor)"
+        help="Run mode: web (Gradio interface), trading (trading floor) or compact-logs (archive old logs)"
     )
     
     args = parser.parse_args()
@@ -44,6 +50,8 @@ def main_cli():
         run_web_app()
     elif args.mode == "trading":
         asyncio.run(run_trading_floor())
+    elif args.mode == "compact-logs":
+        run_log_compaction()
 
 
 if __name__ == "__main__":
@@ -1,15 +1,54 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 import json
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from datetime import datetime
-from market import get_share_price
-from database import write_account, read_account, write_log
+from market import get_share_price, get_share_prices, get_price_epoch
+from database import (
+    write_account,
+    write_account_changes,
+    read_account,
+    write_log,
+    transaction,
+    after_commit,
+    StaleAccountError,
+)
 
 load_dotenv(override=True)
 
+logger = logging.getLogger("ai_stock_trader.accounts")
+
 INITIAL_BALANCE = 10_000.0
 SPREAD = 0.002
 
+# Seconds to hold saves back so that an account mutated repeatedly is written once; 0 writes at once
+WRITE_BEHIND_SECONDS = float(os.getenv("ACCOUNT_WRITE_BEHIND_SECONDS", "0"))
+
+# Accounts with saves held back by write-behind, by name; the lock is held while they are written
+_pending_saves: dict[str, "Account"] = {}
+_pending_lock = threading.Lock()
+_flush_timer: threading.Timer | None = None
+
+# The compact report given to the models: how many recent transactions, and how much of each rationale
+ACCOUNT_REPORT_COMPACT = os.getenv("ACCOUNT_REPORT_MODE", "compact").strip().lower() == "compact"
+REPORT_TRANSACTIONS = int(os.getenv("REPORT_TRANSACTIONS", "10"))
+REPORT_RATIONALE_CHARS = int(os.getenv("REPORT_RATIONALE_CHARS", "160"))
+
+# Latest report per (account name, compact), with the account version and price epoch it was built at
+_report_cache: dict[tuple[str, bool], tuple[int, object, str]] = {}
+_report_cache_lock = threading.Lock()
+
+
+def evict_reports(name: str):
+    """ Drop the account's cached reports, e.g. after a write of it failed. """
+    with _report_cache_lock:
+        for compact in (True, False):
+            _report_cache.pop((name.lower(), compact), None)
+
 
 class Transaction(BaseModel):
     symbol: str
@@ -25,6 +64,27 @@ class Transaction(BaseModel):
         return f"{abs(self.quantity)} shares of {self.symbol} at {self.price} each."
 
 
+class Position(BaseModel):
+    quantity: int = 0
+    cost_basis: float = 0.0
+    realized_pnl: float = 0.0
+
+    def average_cost(self) -> float:
+        return self.cost_basis / self.quantity if self.quantity else 0.0
+
+    def apply(self, quantity: int, price: float):
+        """ Update for a trade at `price`: buys add to the cost basis, sells realize P&L against the average cost. """
+        if quantity > 0:
+            self.cost_basis += quantity * price
+        else:
+            sold_cost = self.average_cost() * -quantity
+            self.realized_pnl += -quantity * price - sold_cost
+            self.cost_basis -= sold_cost
+        self.quantity += quantity
+        if self.quantity == 0:
+            self.cost_basis = 0.0
+
+
 class Account(BaseModel):
     name: str
     balance: float
@@ -32,10 +92,42 @@ class Account(BaseModel):
     holdings: dict[str, int]
     transactions: list[Transaction]
     portfolio_value_time_series: list[tuple[str, float]]
+    # Running totals kept in step with transactions: cash spent on purchases less sale proceeds,
+    # and cost basis and realized P&L by symbol
+    net_invested: float = 0.0
+    positions: dict[str, Position] = {}
+    # Goes up by one with every change to the account other than recording its value
+    version: int = 0
+
+    # How much of each history list is already in the database, so save() only appends the rest
+    _saved_transactions: int = PrivateAttr(0)
+    _saved_values: int = PrivateAttr(0)
+    # The stored version this copy was read or last written at; None if never stored
+    _saved_version: int | None = PrivateAttr(None)
+    # Open unit_of_work() blocks, and the save, log messages and commit callbacks they have deferred
+    _unit_depth: int = PrivateAttr(0)
+    _dirty: bool = PrivateAttr(False)
+    _pending_logs: list[str] = PrivateAttr(default_factory=list)
+    _pending_callbacks: list = PrivateAttr(default_factory=list)
+    # Set when a held-back save of this copy lost to another writer; the copy can no longer be saved
+    _conflicted: bool = PrivateAttr(False)
 
     @classmethod
     def get(cls, name: str):
+        pending = pending_account(name)
+        if pending:
+            # Its latest state has not been written yet
+            return pending
         fields = read_account(name.lower())
+        if fields and fields.get("net_invested") is None:
+            # Saved before positions were tracked, so derive them from the history once
+            fields.pop("net_invested", None)
+            fields.pop("positions", None)
+            account = cls(**fields)
+            account._mark_saved()
+            account.rebuild_positions()
+            account._write()
+            return account
         if not fields:
             fields = {
                 "name": name.lower(),
@@ -43,14 +135,127 @@ class Account(BaseModel):
                 "strategy": "",
                 "holdings": {},
                 "transactions": [],
-                "portfolio_value_time_series": []
+                "portfolio_value_time_series": [],
+                "net_invested": 0.0,
+                "positions": {},
             }
             write_account(name, fields)
-        return cls(**fields)
-    
-    
+        account = cls(**fields)
+        account._mark_saved()
+        return account
+
+    def _mark_saved(self):
+        self._saved_transactions = len(self.transactions)
+        self._saved_values = len(self.portfolio_value_time_series)
+        self._saved_version = self.version
+
     def save(self):
-        write_account(self.name.lower(), self.model_dump())
+        """
+        Persist the account, at the end of the enclosing unit of work or after the write-behind delay if either applies.
+
+        Raises StaleAccountError if a held-back save of this copy has already lost to another writer.
+        """
+        if self._conflicted:
+            raise StaleAccountError(f"Account {self.name} was changed by another writer while its save was held back")
+        if self._unit_depth:
+            self._dirty = True
+        elif WRITE_BEHIND_SECONDS > 0:
+            _schedule_save(self)
+        else:
+            self._write()
+
+    def _write(self):
+        """
+        Write the account, appending only transactions and values recorded since the last write.
+
+        Raises StaleAccountError, writing nothing, if the stored account has moved on
+        from the version this copy was read at. What has been saved only moves on once
+        the enclosing transaction commits, so a rollback leaves it to be written again.
+        """
+        # Take the lengths first so history appended while writing is left for the next write
+        transactions = len(self.transactions)
+        values = len(self.portfolio_value_time_series)
+        version = self.version
+        try:
+            if transactions < self._saved_transactions or values < self._saved_values:
+                # History was truncated (e.g. by reset), so the stored copy must be replaced
+                write_account(self.name.lower(), self.model_dump(), expected_version=self._saved_version)
+            else:
+                write_account_changes(
+                    self.name.lower(),
+                    self.balance,
+                    self.strategy,
+                    dict(self.holdings),
+                    [transaction.model_dump() for transaction in self.transactions[self._saved_transactions:transactions]],
+                    self.portfolio_value_time_series[self._saved_values:values],
+                    self.net_invested,
+                    {symbol: position.model_dump() for symbol, position in self.positions.items()},
+                    version,
+                    expected_version=self._saved_version,
+                )
+        except BaseException:
+            # A report of this copy may describe state that is not stored
+            evict_reports(self.name)
+            raise
+
+        def mark_saved():
+            self._saved_transactions = transactions
+            self._saved_values = values
+            self._saved_version = version
+
+        after_commit(mark_saved)
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        Defer the saves and account log entries made inside the block and write them
+        together in one database transaction when it exits; nested blocks join the
+        outermost. If the block raises, nothing is written.
+        """
+        self._unit_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._unit_depth -= 1
+            if not self._unit_depth:
+                self._dirty = False
+                self._pending_logs = []
+                self._pending_callbacks = []
+                evict_reports(self.name)
+            raise
+        self._unit_depth -= 1
+        if not self._unit_depth:
+            dirty, messages, callbacks = self._dirty, self._pending_logs, self._pending_callbacks
+            self._dirty, self._pending_logs, self._pending_callbacks = False, [], []
+            try:
+                with transaction():
+                    if dirty:
+                        self.save()
+                    for message in messages:
+                        write_log(self.name, "account", message)
+                    for callback in callbacks:
+                        after_commit(callback)
+            except BaseException:
+                evict_reports(self.name)
+                raise
+
+    def _on_commit(self, callback):
+        """ Run callback once the changes made so far are committed, at the end of any open unit of work. """
+        if self._unit_depth:
+            self._pending_callbacks.append(callback)
+        else:
+            after_commit(callback)
+
+    def _mutated(self):
+        """ Bump the version, which invalidates cached reports of the previous state. """
+        self.version += 1
+        evict_reports(self.name)
+
+    def _log(self, message: str):
+        if self._unit_depth:
+            self._pending_logs.append(message)
+        else:
+            write_log(self.name, "account", message)
 
     def reset(self, strategy: str):
         self.balance = INITIAL_BALANCE
@@ -58,6 +263,9 @@ class Account(BaseModel):
         self.holdings = {}
         self.transactions = []
         self.portfolio_value_time_series = []
+        self.net_invested = 0.0
+        self.positions = {}
+        self._mutated()
         self.save()
 
     def deposit(self, amount: float):
@@ -66,6 +274,7 @@ class Account(BaseModel):
             raise ValueError("Deposit amount must be positive.")
         self.balance += amount
         print(f"Deposited ${amount}. New balance: ${self.balance}")
+        self._mutated()
         self.save()
 
     def withdraw(self, amount: float):
@@ -74,69 +283,105 @@ class Account(BaseModel):
             raise ValueError("Insufficient funds for withdrawal.")
         self.balance -= amount
         print(f"Withdrew ${amount}. New balance: ${self.balance}")
+        self._mutated()
         self.save()
 
+    def _apply_trade(self, symbol: str, quantity: int, price: float):
+        self.net_invested += quantity * price
+        self.positions.setdefault(symbol, Position()).apply(quantity, price)
+
+    def rebuild_positions(self):
+        """ Recompute net_invested and positions from the full transaction history. """
+        self.net_invested = 0.0
+        self.positions = {}
+        for transaction in self.transactions:
+            self._apply_trade(transaction.symbol, transaction.quantity, transaction.price)
+
     def buy_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Buy shares of a stock if sufficient funds are available. """
-        price = get_share_price(symbol)
-        buy_price = price * (1 + SPREAD)
-        total_cost = buy_price * quantity
-        
-        if total_cost > self.balance:
-            raise ValueError("Insufficient funds to buy shares.")
-        elif price==0:
-            raise ValueError(f"Unrecognized symbol {symbol}")
-        
-        # Update holdings
-        self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
-        self.transactions.append(transaction)
-        
-        # Update balance
-        self.balance -= total_cost
-        self.save()
-        write_log(self.name, "account", f"Bought {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        with self.unit_of_work():
+            price = get_share_price(symbol)
+            buy_price = price * (1 + SPREAD)
+            total_cost = buy_price * quantity
+
+            if total_cost > self.balance:
+                raise ValueError("Insufficient funds to buy shares.")
+            elif price==0:
+                raise ValueError(f"Unrecognized symbol {symbol}")
+
+            # Update holdings
+            self.holdings[symbol] = self.holdings.get(symbol, 0) + quantity
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Record transaction
+            transaction = Transaction(symbol=symbol, quantity=quantity, price=buy_price, timestamp=timestamp, rationale=rationale)
+            self.transactions.append(transaction)
+            self._apply_trade(symbol, quantity, buy_price)
+
+            # Update balance
+            self.balance -= total_cost
+            self._mutated()
+            self.save()
+            self._log(f"Bought {quantity} of {symbol}")
+            return "Completed. Latest details:\n" + self.report()
 
     def sell_shares(self, symbol: str, quantity: int, rationale: str) -> str:
         """ Sell shares of a stock if the user has enough shares. """
-        if self.holdings.get(symbol, 0) < quantity:
-            raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
-        
-        price = get_share_price(symbol)
-        sell_price = price * (1 - SPREAD)
-        total_proceeds = sell_price * quantity
-        
-        # Update holdings
-        self.holdings[symbol] -= quantity
-        
-        # If shares are completely sold, remove from holdings
-        if self.holdings[symbol] == 0:
-            del self.holdings[symbol]
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        # Record transaction
-        transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
-        self.transactions.append(transaction)
-
-        # Update balance
-        self.balance += total_proceeds
-        self.save()
-        write_log(self.name, "account", f"Sold {quantity} of {symbol}")
-        return "Completed. Latest details:\n" + self.report()
+        with self.unit_of_work():
+            if self.holdings.get(symbol, 0) < quantity:
+                raise ValueError(f"Cannot sell {quantity} shares of {symbol}. Not enough shares held.")
+
+            price = get_share_price(symbol)
+            sell_price = price * (1 - SPREAD)
+            total_proceeds = sell_price * quantity
 
-    def calculate_portfolio_value(self):
-        """ Calculate the total value of the user's portfolio. """
+            # Update holdings
+            self.holdings[symbol] -= quantity
+
+            # If shares are completely sold, remove from holdings
+            if self.holdings[symbol] == 0:
+                del self.holdings[symbol]
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            # Record transaction
+            transaction = Transaction(symbol=symbol, quantity=-quantity, price=sell_price, timestamp=timestamp, rationale=rationale)  # negative quantity for sell
+            self.transactions.append(transaction)
+            self._apply_trade(symbol, -quantity, sell_price)
+
+            # Update balance
+            self.balance += total_proceeds
+            self._mutated()
+            self.save()
+            self._log(f"Sold {quantity} of {symbol}")
+            return "Completed. Latest details:\n" + self.report()
+
+    def calculate_portfolio_value(self, prices: dict[str, float] | None = None):
+        """ Calculate the total value of the user's portfolio, pricing the holdings unless `prices` are given. """
+        if prices is None:
+            prices = get_share_prices(list(self.holdings))
         total_value = self.balance
         for symbol, quantity in self.holdings.items():
-            total_value += get_share_price(symbol) * quantity
+            total_value += prices.get(symbol, 0.0) * quantity
         return total_value
 
     def calculate_profit_loss(self, portfolio_value: float):
         """ Calculate profit or loss from the initial spend. """
-        initial_spend = sum(transaction.total() for transaction in self.transactions)
-        return portfolio_value - initial_spend - self.balance
+        return portfolio_value - self.net_invested - self.balance
+
+    def get_position_breakdown(self, prices: dict[str, float] | None = None) -> dict[str, dict]:
+        """ Cost basis, market value and realized and unrealized P&L for every symbol traded. """
+        if prices is None:
+            prices = get_share_prices(list(self.holdings))
+        breakdown = {}
+        for symbol, position in self.positions.items():
+            market_value = prices.get(symbol, 0.0) * position.quantity
+            breakdown[symbol] = {
+                "quantity": position.quantity,
+                "average_cost": position.average_cost(),
+                "cost_basis": position.cost_basis,
+                "market_value": market_value,
+                "unrealized_pnl": market_value - position.cost_basis,
+                "realized_pnl": position.realized_pnl,
+            }
+        return breakdown
 
     def get_holdings(self):
         """ Report the current holdings of the user. """
@@ -150,29 +395,162 @@ class Account(BaseModel):
         """ List all transactions made by the user. """
         return [transaction.model_dump() for transaction in self.transactions]
     
-    def report(self) -> str:
-        """ Return a json string representing the account.  """
-        portfolio_value = self.calculate_portfolio_value()
-        self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
-        self.save()
-        pnl = self.calculate_profit_loss(portfolio_value)
-        data = self.model_dump()
-        data["total_portfolio_value"] = portfolio_value
-        data["total_profit_loss"] = pnl
-        write_log(self.name, "account", f"Retrieved account details")
-        return json.dumps(data)
+    def report(self, compact: bool | None = None) -> str:
+        """
+        Return a json string representing the account; compact unless ACCOUNT_REPORT_MODE says otherwise.
+
+        Reports are cached until the account is mutated or share prices may have
+        changed, so repeated reads in a cycle neither refetch prices nor record
+        another portfolio value. A report is only cached once the state it
+        describes has been committed.
+        """
+        if compact is None:
+            compact = ACCOUNT_REPORT_COMPACT
+        key = (self.name.lower(), compact)
+        epoch = get_price_epoch()
+        if epoch is not None:
+            with _report_cache_lock:
+                cached = _report_cache.get(key)
+            if cached and cached[0] == self.version and cached[1] == epoch:
+                self._log(f"Retrieved account details")
+                return cached[2]
+        report = self._build_report(compact)
+        if epoch is not None:
+            version = self.version
+
+            def cache_report():
+                with _report_cache_lock:
+                    _report_cache[key] = (version, epoch, report)
+
+            self._on_commit(cache_report)
+        return report
+
+    def _build_report(self, compact: bool) -> str:
+        with self.unit_of_work():
+            prices = get_share_prices(list(self.holdings))
+            portfolio_value = self.calculate_portfolio_value(prices)
+            self.portfolio_value_time_series.append((datetime.now().strftime("%Y-%m-%d %H:%M:%S"), portfolio_value))
+            self.save()
+            pnl = self.calculate_profit_loss(portfolio_value)
+            breakdown = self.get_position_breakdown(prices)
+            if compact:
+                data = self._compact_report(breakdown)
+            else:
+                data = self.model_dump()
+                data["positions"] = breakdown
+            data["total_portfolio_value"] = portfolio_value
+            data["total_profit_loss"] = pnl
+            self._log(f"Retrieved account details")
+            return json.dumps(data)
+
+    def _compact_report(self, breakdown: dict[str, dict]) -> dict:
+        """ Open positions with their cost basis, P&L totals and the latest transactions, sized for a prompt. """
+        def rationale(text: str) -> str:
+            return text if len(text) <= REPORT_RATIONALE_CHARS else text[:REPORT_RATIONALE_CHARS] + "..."
+
+        return {
+            "name": self.name,
+            "balance": round(self.balance, 2),
+            "holdings": {
+                symbol: {
+                    "quantity": position["quantity"],
+                    "average_cost": round(position["average_cost"], 2),
+                    "market_value": round(position["market_value"], 2),
+                    "unrealized_pnl": round(position["unrealized_pnl"], 2),
+                }
+                for symbol, position in breakdown.items()
+                if position["quantity"]
+            },
+            "realized_pnl": round(sum(position["realized_pnl"] for position in breakdown.values()), 2),
+            "transaction_count": len(self.transactions),
+            "recent_transactions": [
+                {
+                    "symbol": transaction.symbol,
+                    "quantity": transaction.quantity,
+                    "price": round(transaction.price, 2),
+                    "timestamp": transaction.timestamp,
+                    "rationale": rationale(transaction.rationale),
+                }
+                for transaction in self.transactions[-REPORT_TRANSACTIONS:]
+            ],
+        }
     
     def get_strategy(self) -> str:
         """ Return the strategy of the account """
-        write_log(self.name, "account", f"Retrieved strategy")
+        self._log(f"Retrieved strategy")
         return self.strategy
     
     def change_strategy(self, strategy: str) -> str:
         """ At your discretion, if you choose to, call this to change your investment strategy for the future """
-        self.strategy = strategy
-        self.save()
-        write_log(self.name, "account", f"Changed strategy")
-        return "Changed strategy"
+        with self.unit_of_work():
+            self.strategy = strategy
+            self._mutated()
+            self.save()
+            self._log(f"Changed strategy")
+            return "Changed strategy"
+
+def pending_account(name: str) -> Account | None:
+    """ Return the account if write-behind is holding back its latest save. """
+    with _pending_lock:
+        return _pending_saves.get(name.lower())
+
+
+def _start_flush_timer():
+    """ Schedule a flush unless one is already scheduled; call with _pending_lock held. """
+    global _flush_timer
+    if _flush_timer is None:
+        _flush_timer = threading.Timer(WRITE_BEHIND_SECONDS, flush_pending_saves)
+        _flush_timer.daemon = True
+        _flush_timer.start()
+
+
+def _schedule_save(account: Account):
+    with _pending_lock:
+        if account._conflicted:
+            # A flush discarded it after save() checked
+            raise StaleAccountError(f"Account {account.name} was changed by another writer while its save was held back")
+        _pending_saves[account.name.lower()] = account
+        _start_flush_timer()
+
+
+def flush_pending_saves():
+    """
+    Write every account whose save is being held back, in one transaction.
+
+    Accounts that could not be written stay held back and are retried after another
+    delay. An account that another writer changed meanwhile can never be written,
+    so its held-back copy is discarded and marked as conflicted: the next
+    Account.get reads the stored account, and saving the discarded copy raises
+    StaleAccountError for the caller to rerun its operation.
+    """
+    global _flush_timer
+    with _pending_lock:
+        _flush_timer = None
+        if not _pending_saves:
+            return
+        conflicts = {}
+        try:
+            with transaction():
+                for name, account in list(_pending_saves.items()):
+                    try:
+                        account._write()
+                    except StaleAccountError as e:
+                        conflicts[name] = e
+        except Exception as e:
+            logger.error(f"Failed to write accounts {list(_pending_saves)}, retrying: {e}")
+            _start_flush_timer()
+            return
+        flushed = dict(_pending_saves)
+        _pending_saves.clear()
+        for name, error in conflicts.items():
+            flushed[name]._conflicted = True
+            evict_reports(name)
+            logger.warning(f"Discarded held-back changes to account {name}: {error}")
+            write_log(name, "account", "Discarded changes that conflicted with another writer")
+
+
+atexit.register(flush_pending_saves)
+
 
 # Example of usage:
 if __name__ == "__main__":
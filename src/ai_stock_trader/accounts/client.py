@@ -1,39 +1,169 @@
+import asyncio
+import anyio
 import mcp
 from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
 from agents import FunctionTool
+from accounts_service import account_service
+from dotenv import load_dotenv
+from metrics import timer, observe
 import json
+import os
+import time
+
+load_dotenv(override=True)
+
+# "inprocess" calls AccountService directly; "mcp" goes through the accounts MCP server
+ACCOUNTS_TRANSPORT = os.getenv("ACCOUNTS_TRANSPORT", "inprocess").strip().lower()
 
 params = StdioServerParameters(command="uv", args=["run", "accounts_server.py"], env=None)
 
+# Errors meaning the session's transport has gone, as opposed to errors returned by the server
+TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+    EOFError,
+)
+
+
+class AccountsClient:
+    """
+    A persistent MCP client for the accounts server.
+
+    The server process and its ClientSession are started on first use and kept open,
+    so each call is a single JSON-RPC round trip; concurrent calls share the session.
+    If the session dies it is reopened on the next call. Read-only requests that
+    fail because the transport has gone are retried once on a fresh session; tool
+    calls are not, since the failed call may already have been applied. Errors the
+    server returns leave the session as it is. The tools list is fetched once per
+    session.
+    """
+
+    def __init__(self, server_params: StdioServerParameters = params):
+        self.server_params = server_params
+        self.session: mcp.ClientSession | None = None
+        self._tools = None
+        self._connect_lock: asyncio.Lock | None = None
+        self._owner: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    async def _own(self, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        # The stdio transport must be closed by the task that opened it, so the session
+        # lives in this task for its whole life
+        started = time.perf_counter()
+        try:
+            async with stdio_client(self.server_params) as streams:
+                async with mcp.ClientSession(*streams) as session:
+                    await session.initialize()
+                    observe("mcp_server_startup", time.perf_counter() - started, server="accounts")
+                    self.session = session
+                    ready.set_result(None)
+                    await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Accounts client session ended: {e}")
+        finally:
+            self.session = None
+            self._tools = None
+
+    async def _get_session(self) -> mcp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. another asyncio.run) cannot reuse the old session
+            self._loop = loop
+            self._connect_lock = asyncio.Lock()
+            self.session = None
+            self._owner = None
+        async with self._connect_lock:
+            if self.session is None:
+                if self._owner:
+                    self._stop.set()
+                    await self._owner
+                ready = loop.create_future()
+                self._stop = asyncio.Event()
+                self._owner = asyncio.create_task(self._own(ready, self._stop))
+                await ready
+            return self.session
+
+    async def _reconnect(self) -> None:
+        async with self._connect_lock:
+            if self._owner:
+                self._stop.set()
+                await self._owner
+                self._owner = None
+
+    async def _read(self, request):
+        session = await self._get_session()
+        try:
+            return await request(session)
+        except TRANSPORT_ERRORS:
+            await self._reconnect()
+            return await request(await self._get_session())
+
+    async def list_tools(self):
+        if self._tools is None:
+            result = await self._read(lambda session: session.list_tools())
+            self._tools = result.tools
+        return self._tools
+
+    async def call_tool(self, tool_name, tool_args):
+        session = await self._get_session()
+        try:
+            with timer("mcp_tool_call", tool=tool_name):
+                return await session.call_tool(tool_name, tool_args)
+        except TRANSPORT_ERRORS:
+            await self._reconnect()
+            raise
+
+    async def read_resource(self, uri: str) -> str:
+        result = await self._read(lambda session: session.read_resource(uri))
+        return result.contents[0].text
+
+    async def close(self) -> None:
+        if self._owner and self._loop is asyncio.get_running_loop():
+            await self._reconnect()
+
+
+accounts_client = AccountsClient()
+
 
 async def list_accounts_tools():
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
-        
+    if ACCOUNTS_TRANSPORT == "inprocess":
+        from accounts_server import mcp as accounts_mcp
+        return await accounts_mcp.list_tools()
+    return await accounts_client.list_tools()
+
+def tool_result_value(result: mcp.types.CallToolResult):
+    """ The value a tool returned, unwrapped from its MCP result; a tool error is raised as ValueError. """
+    text = "".join(item.text for item in result.content if item.type == "text")
+    if result.isError:
+        raise ValueError(text)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
 async def call_accounts_tool(tool_name, tool_args):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
-            
+    """ Call an accounts tool and return its value, the same on either transport. """
+    if ACCOUNTS_TRANSPORT == "inprocess":
+        args = dict(tool_args)
+        return await account_service.call(tool_name, args.pop("name"), **args)
+    return tool_result_value(await accounts_client.call_tool(tool_name, tool_args))
+
 async def read_accounts_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://accounts_server/{name}")
-            return result.contents[0].text
-        
+    if ACCOUNTS_TRANSPORT == "inprocess":
+        return await account_service.call("get_report", name)
+    return await accounts_client.read_resource(f"accounts://accounts_server/{name}")
+
 async def read_strategy_resource(name):
-    async with stdio_client(params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.read_resource(f"accounts://strategy/{name}")
-            return result.contents[0].text
+    if ACCOUNTS_TRANSPORT == "inprocess":
+        return await account_service.call("get_strategy", name)
+    return await accounts_client.read_resource(f"accounts://strategy/{name}")
 
 async def get_accounts_tools_openai():
     openai_tools = []
@@ -44,7 +174,7 @@ async def get_accounts_tools_openai():
             description=tool.description,
             params_json_schema=schema,
             on_invoke_tool=lambda ctx, args, toolname=tool.name: call_accounts_tool(toolname, json.loads(args))
-                
+
         )
         openai_tools.append(openai_tool)
-    return openai_tools
\ No newline at end of file
+    return openai_tools
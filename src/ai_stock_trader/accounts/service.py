@@ -0,0 +1,113 @@
+import asyncio
+from collections import defaultdict
+from accounts import Account, pending_account, evict_reports
+from database import (
+    read_balance,
+    read_strategy,
+    read_holdings,
+    read_transactions,
+    read_account_summary,
+    write_log,
+    StaleAccountError,
+)
+
+# Attempts at an operation whose save keeps losing to another writer of the account
+CONFLICT_RETRIES = 3
+
+
+class AccountService:
+    """
+    The account operations offered to traders, independent of how they are reached.
+
+    The accounts MCP server is a thin adapter over this class for the agents' tools,
+    while code running alongside the accounts (the trading floor's prompt building,
+    the dashboard) can call it directly and skip the stdio JSON-RPC round trip.
+
+    Reads of a single part of an account go straight to the table holding it rather
+    than loading the whole account with its history, so they cost the same however
+    old the account is.
+
+    Changes are made optimistically: an operation that loses a race with another
+    writer of the same account is rerun on a fresh copy. Within a process, `call`
+    also runs one operation per account at a time, so concurrent tool calls for
+    an account queue instead of conflicting.
+    """
+
+    def __init__(self):
+        self._locks: defaultdict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def call(self, method: str, name: str, *args, **kwargs):
+        """ Run a method on a worker thread, after any other call for the same account has finished. """
+        async with self._locks[name.lower()]:
+            return await asyncio.to_thread(getattr(self, method), name, *args, **kwargs)
+
+    def _mutate(self, name: str, operation):
+        for attempt in range(CONFLICT_RETRIES):
+            try:
+                return operation(self.get_account(name))
+            except StaleAccountError:
+                # The losing copy's reports describe a state that was never stored
+                evict_reports(name)
+                if attempt == CONFLICT_RETRIES - 1:
+                    raise
+
+    def _project(self, name: str, read, field: str):
+        # Accounts with saves held back, or not created yet, have to go through Account
+        if pending_account(name) is None:
+            value = read(name)
+            if value is not None:
+                return value
+        return getattr(self.get_account(name), field)
+
+    def get_account(self, name: str) -> Account:
+        return Account.get(name.lower())
+
+    def get_balance(self, name: str) -> float:
+        return self._project(name, read_balance, "balance")
+
+    def get_holdings(self, name: str) -> dict[str, int]:
+        return self._project(name, read_holdings, "holdings")
+
+    def get_recent_transactions(self, name: str, last_n: int = 10) -> list[dict]:
+        account = pending_account(name)
+        if account:
+            return account.list_transactions()[-last_n:]
+        return read_transactions(name, last_n)
+
+    def get_summary(self, name: str) -> dict:
+        """ The account's balance, strategy, holdings and positions, without its history. """
+        if pending_account(name) is None:
+            summary = read_account_summary(name)
+            if summary and summary["positions"] is not None:
+                return summary
+        account = self.get_account(name)
+        return {
+            "name": account.name,
+            "balance": account.balance,
+            "strategy": account.strategy,
+            "holdings": account.holdings,
+            "net_invested": account.net_invested,
+            "positions": {symbol: position.model_dump() for symbol, position in account.positions.items()},
+            "latest_value": account.portfolio_value_time_series[-1] if account.portfolio_value_time_series else None,
+        }
+
+    def buy_shares(self, name: str, symbol: str, quantity: int, rationale: str) -> str:
+        return self._mutate(name, lambda account: account.buy_shares(symbol, quantity, rationale))
+
+    def sell_shares(self, name: str, symbol: str, quantity: int, rationale: str) -> str:
+        return self._mutate(name, lambda account: account.sell_shares(symbol, quantity, rationale))
+
+    def change_strategy(self, name: str, strategy: str) -> str:
+        return self._mutate(name, lambda account: account.change_strategy(strategy))
+
+    def get_report(self, name: str) -> str:
+        # Reports record the portfolio value, so they can conflict too
+        return self._mutate(name, lambda account: account.report())
+
+    def get_strategy(self, name: str) -> str:
+        strategy = self._project(name, read_strategy, "strategy")
+        write_log(name.lower(), "account", "Retrieved strategy")
+        return strategy
+
+
+account_service = AccountService()
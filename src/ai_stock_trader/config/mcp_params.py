@@ -28,19 +28,25 @@ trader_mcp_server_params = [
 ]
 
 # The full set of MCP servers for the researcher: Fetch, Brave Search and Memory
+# Fetch and Brave Search are stateless; Memory keeps a knowledge graph per trader
+
+researcher_shared_mcp_server_params = [
+    {"command": "uvx", "args": ["mcp-server-fetch"]},
+    {
+        "command": "npx",
+        "args": ["-y", "@modelcontextprotocol/server-brave-search"],
+        "env": brave_env,
+    },
+]
+
+
+def researcher_memory_mcp_server_params(name: str):
+    return {
+        "command": "npx",
+        "args": ["-y", "mcp-memory-libsql"],
+        "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
+    }
 
 
 def researcher_mcp_server_params(name: str):
-    return [
-        {"command": "uvx", "args": ["mcp-server-fetch"]},
-        {
-            "command": "npx",
-            "args": ["-y", "@modelcontextprotocol/server-brave-search"],
-            "env": brave_env,
-        },
-        {
-            "command": "npx",
-            "args": ["-y", "mcp-memory-libsql"],
-            "env": {"LIBSQL_URL": f"file:./memory/{name}.db"},
-        },
-    ]
+    return researcher_shared_mcp_server_params + [researcher_memory_mcp_server_params(name)]
@@ -0,0 +1,144 @@
+"""
+The traders on the floor.
+
+Traders are rows of the traders table: a name, a last name, the model they run on,
+the model's display name for the dashboard, their strategy and whether they are
+enabled. When TRADERS_FILE is set, the JSON list of traders in it is upserted into
+the table on every load, so traders are added or retired by editing the file
+(set "enabled": false to retire one and keep its history). Otherwise an empty
+table is seeded with the four built-in traders, and on every load the built-in
+traders are moved onto the models USE_MANY_MODELS selects.
+"""
+
+import os
+import re
+import json
+from dataclasses import dataclass, asdict
+from dotenv import load_dotenv
+from database import read_traders, write_traders
+
+load_dotenv(override=True)
+
+TRADERS_FILE = os.getenv("TRADERS_FILE", "")
+USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
+
+# Names become account keys and are carried in trace ids (see tracers.make_trace_id),
+# so they are limited to letters and digits and to what fits in a trace id
+TRADER_NAME = re.compile(r"[A-Za-z][A-Za-z0-9]*")
+MAX_TRADER_NAME_LENGTH = 24
+
+SHORT_MODEL_NAMES = {
+    "gpt-4o-mini": "GPT 4o mini",
+    "gpt-4.1-mini": "GPT 4.1 Mini",
+    "deepseek-chat": "DeepSeek V3",
+    "gemini-2.5-flash-preview-04-17": "Gemini 2.5 Flash",
+    "grok-3-mini-beta": "Grok 3 Mini",
+}
+
+warren_strategy = """
+You are Warren, and you are named in homage to your role model, Warren Buffett.
+You are a value-oriented investor who prioritizes long-term wealth creation.
+You identify high-quality companies trading below their intrinsic value.
+You invest patiently and hold positions through market fluctuations,
+relying on meticulous fundamental analysis, steady cash flows, strong management teams,
+and competitive advantages. You rarely react to short-term market movements,
+trusting your deep research and value-driven strategy.
+"""
+
+george_strategy = """
+You are George, and you are named in homage to your role model, George Soros.
+You are an aggressive macro trader who actively seeks significant market
+mispricings. You look for large-scale economic and
+geopolitical events that create investment opportunities. Your approach is contrarian,
+willing to bet boldly against prevailing market sentiment when your macroeconomic analysis
+suggests a significant imbalance. You leverage careful timing and decisive action to
+capitalize on rapid market shifts.
+"""
+
+ray_strategy = """
+You are Ray, and you are named in homage to your role model, Ray Dalio.
+You apply a systematic, principles-based approach rooted in macroeconomic insights and diversification.
+You invest broadly across asset classes, utilizing risk parity strategies to achieve balanced returns
+in varying market environments. You pay close attention to macroeconomic indicators, central bank policies,
+and economic cycles, adjusting your portfolio strategically to manage risk and preserve capital across diverse market conditions.
+"""
+
+cathie_strategy = """
+You are Cathie, and you are named in homage to your role model, Cathie Wood.
+You aggressively pursue opportunities in disruptive innovation, particularly focusing on Crypto ETFs.
+Your strategy is to identify and invest boldly in sectors poised to revolutionize the economy,
+accepting higher volatility for potentially exceptional returns. You closely monitor technological breakthroughs,
+regulatory changes, and market sentiment in crypto ETFs, ready to take bold positions
+and actively manage your portfolio to capitalize on rapid growth trends.
+You focus your trading on crypto ETFs.
+"""
+
+
+@dataclass
+class TraderConfig:
+    name: str
+    lastname: str
+    model_name: str
+    strategy: str
+    short_model_name: str = ""
+    enabled: bool = True
+
+    def __post_init__(self):
+        if not TRADER_NAME.fullmatch(self.name) or len(self.name) > MAX_TRADER_NAME_LENGTH:
+            raise ValueError(
+                f"Invalid trader name {self.name!r}: use a letter followed by letters and digits, "
+                f"at most {MAX_TRADER_NAME_LENGTH} in all"
+            )
+        if not self.short_model_name:
+            self.short_model_name = SHORT_MODEL_NAMES.get(self.model_name, self.model_name)
+
+
+def default_traders() -> list[TraderConfig]:
+    """ The four built-in traders, on four providers' models if USE_MANY_MODELS is set. """
+    if USE_MANY_MODELS:
+        model_names = ["gpt-4.1-mini", "deepseek-chat", "gemini-2.5-flash-preview-04-17", "grok-3-mini-beta"]
+    else:
+        model_names = ["gpt-4o-mini"] * 4
+    return [
+        TraderConfig(name, lastname, model_name, strategy)
+        for (name, lastname, strategy), model_name in zip(
+            [
+                ("Warren", "Patience", warren_strategy),
+                ("George", "Bold", george_strategy),
+                ("Ray", "Systematic", ray_strategy),
+                ("Cathie", "Crypto", cathie_strategy),
+            ],
+            model_names,
+        )
+    ]
+
+
+def read_traders_file(path: str) -> list[TraderConfig]:
+    """ The traders listed in a JSON file; raises ValueError naming the first invalid entry. """
+    with open(path) as f:
+        entries = json.load(f)
+    traders = []
+    for index, trader in enumerate(entries):
+        try:
+            traders.append(TraderConfig(**trader))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{path}: trader {index + 1}: {e}") from e
+    return traders
+
+
+def load_roster(include_disabled: bool = False) -> list[TraderConfig]:
+    """ The traders in the traders table, after syncing TRADERS_FILE or seeding the defaults. """
+    if TRADERS_FILE:
+        write_traders([asdict(trader) for trader in read_traders_file(TRADERS_FILE)])
+    else:
+        stored = {trader["name"].lower(): trader for trader in read_traders(enabled_only=False)}
+        changed = []
+        for trader in default_traders():
+            row = stored.get(trader.name.lower())
+            if row is None and not stored:
+                changed.append(asdict(trader))
+            elif row is not None and row["model_name"] != trader.model_name:
+                changed.append({**row, "model_name": trader.model_name, "short_model_name": trader.short_model_name})
+        if changed:
+            write_traders(changed)
+    return [TraderConfig(**trader) for trader in read_traders(enabled_only=not include_disabled)]
@@ -5,7 +5,8 @@ Configuration management for AI Stock Trader.
 import os
 from pathlib import Path
 from typing import Optional
-from pydantic import BaseSettings, Field
+from pydantic import Field
+from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
@@ -44,17 +45,22 @@ class Settings(BaseSettings):
     
     # Market Data Configuration
     market_data_cache_ttl: int = Field(300, env="MARKET_DATA_CACHE_TTL")
+    quote_cache_stale_ttl: int = Field(1200, env="QUOTE_CACHE_STALE_TTL")
+    quote_cache_size: int = Field(2048, env="QUOTE_CACHE_SIZE")
+    quote_cache_shared: bool = Field(True, env="QUOTE_CACHE_SHARED")
     realtime_data_enabled: bool = Field(True, env="REALTIME_DATA_ENABLED")
     historical_data_days: int = Field(30, env="HISTORICAL_DATA_DAYS")
     
     # AI Agent Configuration
     max_turns: int = Field(30, env="MAX_TURNS")
-    research_timeout: int = Field(60, env="RESEARCH_TIMEOUT")
-    trading_timeout: int = Field(30, env="TRADING_TIMEOUT")
+    # Seconds allowed for one researcher call and for one trader run
+    research_timeout: float = Field(300, env="RESEARCH_TIMEOUT")
+    trading_timeout: float = Field(900, env="TRADING_TIMEOUT")
     
     # MCP Server Configuration
     mcp_server_host: str = Field("localhost", env="MCP_SERVER_HOST")
     mcp_server_port: int = Field(8000, env="MCP_SERVER_PORT")
+    accounts_transport: str = Field("inprocess", env="ACCOUNTS_TRANSPORT")
     
     # Development Configuration
     debug: bool = Field(False, env="DEBUG")
@@ -64,6 +70,8 @@ class Settings(BaseSettings):
         env_file = ".env"
         env_file_encoding = "utf-8"
         case_sensitive = False
+        # .env also holds settings that are read elsewhere, such as USE_MANY_MODELS
+        extra = "ignore"
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -0,0 +1,301 @@
+"""
+Offline backtesting: replay historical bars through the account trading rules.
+
+Bars come from the `market_prices` table or from a CSV/Parquet file with date,
+ticker and close columns, and are pivoted into a dates x tickers matrix of
+closes. A strategy is asked for orders at each bar and they are filled the way
+Account fills them: buys at close * (1 + SPREAD) only if the cash covers them,
+sells at close * (1 - SPREAD) only if enough shares are held. Holdings and cash
+are only tracked as fills happen; the portfolio is valued at every bar in one
+pass at the end, from the cumulative fills and the price matrix, so replaying
+years of bars for hundreds of tickers takes seconds. Nothing here touches the
+network or the stored accounts.
+"""
+
+import os
+import argparse
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from accounts import INITIAL_BALANCE, SPREAD, Transaction
+from database import read_market_bars, read_account
+
+
+@dataclass
+class Bars:
+    """ Closes for every ticker at every date, carried forward over gaps; NaN before a ticker's first bar. """
+
+    dates: np.ndarray
+    tickers: list[str]
+    closes: np.ndarray
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "Bars":
+        """ Build from long-format rows with date, ticker and close columns. """
+        frame = frame.rename(columns=str.lower)
+        wide = frame.pivot_table(index="date", columns="ticker", values="close", aggfunc="last")
+        wide = wide.sort_index().ffill()
+        return cls(
+            dates=wide.index.astype(str).to_numpy(),
+            tickers=[str(ticker) for ticker in wide.columns],
+            closes=wide.to_numpy(dtype=np.float64),
+        )
+
+    @classmethod
+    def from_database(cls, start: str | None = None, end: str | None = None, tickers: list[str] | None = None) -> "Bars":
+        """ Load the closes stored in `market_prices`. """
+        rows = read_market_bars(start, end, tickers)
+        if not rows:
+            raise ValueError("No stored market prices in that range")
+        return cls.from_frame(pd.DataFrame(rows, columns=["date", "ticker", "close"]))
+
+    @classmethod
+    def from_file(cls, path: str) -> "Bars":
+        """ Load a CSV or Parquet file of date, ticker, close rows (other columns are ignored). """
+        if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+            frame = pd.read_parquet(path)
+        else:
+            frame = pd.read_csv(path)
+        return cls.from_frame(frame)
+
+    def index_of(self, timestamp: str) -> int:
+        """ The first bar at or after a timestamp, comparing at the bars' own precision. """
+        return int(np.searchsorted(self.dates, timestamp[: len(self.dates[0])], side="left"))
+
+
+@dataclass
+class Portfolio:
+    """ Cash and holdings as the replay stands at the current bar, for strategies to read. """
+
+    cash: float
+    holdings: np.ndarray
+
+    def quantity(self, column: int) -> int:
+        return int(self.holdings[column])
+
+
+class Strategy(ABC):
+    """
+    Decides the orders to place at each bar.
+
+    `prepare` is called once with all the bars, so that indicators can be computed
+    for the whole matrix up front; `orders` is then called for each bar and returns
+    (ticker, quantity, rationale) tuples, positive to buy and negative to sell.
+    """
+
+    def prepare(self, bars: Bars) -> None:
+        pass
+
+    @abstractmethod
+    def orders(self, index: int, bars: Bars, portfolio: Portfolio) -> list[tuple[str, int, str]]:
+        ...
+
+
+class BuyAndHold(Strategy):
+    """ Spend the initial cash equally across the tickers at the first bar where each has a price. """
+
+    def __init__(self, tickers: list[str] | None = None):
+        self.tickers = tickers
+        self._budget = 0.0
+        self._waiting: dict[str, int] = {}
+
+    def prepare(self, bars: Bars) -> None:
+        columns = {ticker: column for column, ticker in enumerate(bars.tickers)}
+        self._waiting = {ticker: columns[ticker] for ticker in self.tickers or bars.tickers if ticker in columns}
+        self._budget = 0.0
+
+    def orders(self, index, bars, portfolio):
+        if not self._budget and self._waiting:
+            self._budget = portfolio.cash / len(self._waiting)
+        orders = []
+        for ticker, column in list(self._waiting.items()):
+            close = bars.closes[index, column]
+            if close > 0:
+                del self._waiting[ticker]
+                orders.append((ticker, int(self._budget // (close * (1 + SPREAD))), "Buy and hold"))
+        return orders
+
+
+class MovingAverageCrossover(Strategy):
+    """
+    Hold a ticker while its fast moving average is above its slow one.
+
+    Each entry is sized at `allocation` of the portfolio's cash at the time.
+    """
+
+    def __init__(self, fast: int = 20, slow: int = 50, allocation: float = 0.1):
+        self.fast = fast
+        self.slow = slow
+        self.allocation = allocation
+        self._signal: np.ndarray | None = None
+
+    def prepare(self, bars: Bars) -> None:
+        closes = pd.DataFrame(bars.closes)
+        # NaN until a ticker has a full window of closes, which compares as not above
+        above = closes.rolling(self.fast).mean().to_numpy() > closes.rolling(self.slow).mean().to_numpy()
+        # +1 where the fast average crosses above the slow one, -1 where it crosses below
+        self._signal = np.diff(above.astype(np.int8), axis=0, prepend=0)
+
+    def orders(self, index, bars, portfolio):
+        orders = []
+        for column in np.flatnonzero(self._signal[index]):
+            ticker = bars.tickers[column]
+            if self._signal[index, column] > 0:
+                price = bars.closes[index, column] * (1 + SPREAD)
+                quantity = int(portfolio.cash * self.allocation // price)
+                if quantity:
+                    orders.append((ticker, quantity, f"{self.fast}/{self.slow} average crossed above"))
+            elif portfolio.quantity(column):
+                orders.append((ticker, -portfolio.quantity(column), f"{self.fast}/{self.slow} average crossed below"))
+        return orders
+
+
+class RecordedDecisions(Strategy):
+    """ Replay trades already made, such as a trader's transaction history, at the bars they fall on. """
+
+    def __init__(self, transactions: list[Transaction]):
+        self.transactions = transactions
+        self._by_bar: dict[int, list[tuple[str, int, str]]] = {}
+
+    @classmethod
+    def from_account(cls, name: str) -> "RecordedDecisions":
+        """ The trades in a stored account's history. """
+        account = read_account(name.lower())
+        if not account:
+            raise ValueError(f"No account named {name}")
+        return cls([Transaction(**transaction) for transaction in account["transactions"]])
+
+    def prepare(self, bars: Bars) -> None:
+        self._by_bar = {}
+        for transaction in self.transactions:
+            index = bars.index_of(transaction.timestamp)
+            if index < len(bars.dates):
+                self._by_bar.setdefault(index, []).append(
+                    (transaction.symbol, transaction.quantity, transaction.rationale)
+                )
+
+    def orders(self, index, bars, portfolio):
+        return self._by_bar.get(index, [])
+
+
+@dataclass
+class BacktestResult:
+    """ Portfolio value, cash and shares held at every bar, with the fills and rejected orders. """
+
+    dates: np.ndarray
+    tickers: list[str]
+    values: np.ndarray
+    cash: np.ndarray
+    holdings: np.ndarray
+    transactions: list[Transaction]
+    rejected: list[tuple[str, str, int, str]] = field(default_factory=list)
+
+    def holdings_at(self, index: int) -> dict[str, int]:
+        return {
+            self.tickers[column]: int(quantity)
+            for column, quantity in enumerate(self.holdings[index])
+            if quantity
+        }
+
+    def summary(self) -> dict:
+        peaks = np.maximum.accumulate(self.values)
+        returns = np.diff(self.values) / self.values[:-1]
+        return {
+            "start": str(self.dates[0]),
+            "end": str(self.dates[-1]),
+            "bars": len(self.dates),
+            "final_value": float(self.values[-1]),
+            "total_return": float(self.values[-1] / self.values[0] - 1),
+            "max_drawdown": float(np.max(1 - self.values / peaks)),
+            "volatility": float(np.std(returns)) if len(returns) else 0.0,
+            "trades": len(self.transactions),
+            "rejected": len(self.rejected),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"date": self.dates, "value": self.values, "cash": self.cash})
+
+
+class Backtest:
+    """
+    Replays a strategy over bars with the account rules.
+
+    Orders that Account would refuse (a buy the cash does not cover, a sale of more
+    shares than are held, a ticker with no price yet) are skipped and recorded in
+    the result's `rejected` list with the reason.
+    """
+
+    def __init__(self, bars: Bars, strategy: Strategy, initial_balance: float = INITIAL_BALANCE, spread: float = SPREAD):
+        self.bars = bars
+        self.strategy = strategy
+        self.initial_balance = initial_balance
+        self.spread = spread
+
+    def run(self) -> BacktestResult:
+        bars = self.bars
+        columns = {ticker: column for column, ticker in enumerate(bars.tickers)}
+        # Shares and cash changed by the fills at each bar; cumulated for valuation at the end
+        fills = np.zeros(bars.closes.shape, dtype=np.int64)
+        cash_flows = np.zeros(len(bars.dates))
+        portfolio = Portfolio(cash=self.initial_balance, holdings=np.zeros(len(bars.tickers), dtype=np.int64))
+        transactions, rejected = [], []
+
+        self.strategy.prepare(bars)
+        for index in range(len(bars.dates)):
+            date = str(bars.dates[index])
+            for ticker, quantity, rationale in self.strategy.orders(index, bars, portfolio):
+                column = columns.get(ticker)
+                close = bars.closes[index, column] if column is not None else np.nan
+                if not quantity:
+                    continue
+                if not close > 0:
+                    rejected.append((date, ticker, quantity, f"Unrecognized symbol {ticker}"))
+                    continue
+                if quantity > 0:
+                    price = close * (1 + self.spread)
+                    if price * quantity > portfolio.cash:
+                        rejected.append((date, ticker, quantity, "Insufficient funds to buy shares."))
+                        continue
+                elif portfolio.holdings[column] < -quantity:
+                    rejected.append((date, ticker, quantity, f"Not enough shares of {ticker} held."))
+                    continue
+                else:
+                    price = close * (1 - self.spread)
+                portfolio.cash -= price * quantity
+                portfolio.holdings[column] += quantity
+                fills[index, column] += quantity
+                cash_flows[index] -= price * quantity
+                transactions.append(
+                    Transaction(symbol=ticker, quantity=quantity, price=price, timestamp=date, rationale=rationale)
+                )
+
+        holdings = np.cumsum(fills, axis=0)
+        cash = self.initial_balance + np.cumsum(cash_flows)
+        values = cash + np.einsum("ij,ij->i", holdings, np.nan_to_num(bars.closes))
+        return BacktestResult(bars.dates, bars.tickers, values, cash, holdings, transactions, rejected)
+
+
+STRATEGIES = {
+    "buy-and-hold": BuyAndHold,
+    "ma-crossover": MovingAverageCrossover,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest a strategy on stored or imported bars")
+    parser.add_argument("--bars", help="CSV or Parquet file of date, ticker, close rows; the market_prices table if omitted")
+    parser.add_argument("--start", help="First date to replay from the market_prices table")
+    parser.add_argument("--end", help="Last date to replay from the market_prices table")
+    parser.add_argument("--strategy", choices=list(STRATEGIES), default="buy-and-hold")
+    parser.add_argument("--replay", metavar="ACCOUNT", help="Replay a stored account's trades instead of a strategy")
+    args = parser.parse_args()
+
+    bars = Bars.from_file(args.bars) if args.bars else Bars.from_database(args.start, args.end)
+    strategy = RecordedDecisions.from_account(args.replay) if args.replay else STRATEGIES[args.strategy]()
+    for key, value in Backtest(bars, strategy).run().summary().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
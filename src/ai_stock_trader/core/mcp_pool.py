@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from agents.mcp import MCPServerStdio
+from metrics import observe
+from mcp_params import (
+    trader_mcp_server_params,
+    researcher_shared_mcp_server_params,
+    researcher_memory_mcp_server_params,
+)
+
+CLIENT_SESSION_TIMEOUT_SECONDS = 120
+HEALTH_CHECK_TIMEOUT_SECONDS = 10
+# Memory servers kept running at once; the least recently used idle one is stopped
+# to make room, so processes track concurrency rather than the number of traders
+MAX_MEMORY_SERVERS = int(os.getenv("MAX_MEMORY_SERVERS", "16"))
+
+
+class MCPServerPool:
+    """
+    Long-lived MCP servers for the trading floor.
+
+    The stateless servers (accounts, push, market, fetch and web search) are started
+    once and shared by every trader; only the researcher's memory server, whose
+    knowledge graph lives in a per-trader database, has one instance per trader.
+    Traders lease the servers for a run instead of spawning their own. Memory
+    servers are started on a trader's first lease and at most `max_memory_servers`
+    are kept, evicting the least recently used one that no run is using; the
+    trader's graph stays in its database file for the next start.
+
+    An MCP stdio session has to be closed by the task that opened it, and sessions
+    opened in one task have to be closed in reverse order. So each server gets its
+    own owner task that connects, waits to be told to stop and then cleans up, which
+    lets servers start in parallel and be restarted one at a time.
+    """
+
+    def __init__(
+        self,
+        client_session_timeout_seconds: float = CLIENT_SESSION_TIMEOUT_SECONDS,
+        max_memory_servers: int = MAX_MEMORY_SERVERS,
+    ):
+        self.client_session_timeout_seconds = client_session_timeout_seconds
+        self.max_memory_servers = max_memory_servers
+        self.trader_servers: list[MCPServerStdio] = []
+        self.researcher_servers: list[MCPServerStdio] = []
+        # Least recently leased first
+        self.memory_servers: OrderedDict[str, MCPServerStdio] = OrderedDict()
+        self._memory_ready: dict[str, asyncio.Task] = {}
+        self._memory_leases: Counter[str] = Counter()
+        self._memory_lock = asyncio.Lock()
+        self._owners: dict[MCPServerStdio, tuple[asyncio.Task, asyncio.Event]] = {}
+
+    def _make_server(self, params) -> MCPServerStdio:
+        # The pooled servers never change their tools, so list them once per connection
+        return MCPServerStdio(
+            params,
+            cache_tools_list=True,
+            client_session_timeout_seconds=self.client_session_timeout_seconds,
+        )
+
+    def _all_servers(self) -> list[MCPServerStdio]:
+        return self.trader_servers + self.researcher_servers + list(self.memory_servers.values())
+
+    async def _own(self, server: MCPServerStdio, ready: asyncio.Future, stop: asyncio.Event) -> None:
+        started = time.perf_counter()
+        try:
+            await server.connect()
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        observe("mcp_server_startup", time.perf_counter() - started, server=server.name)
+        ready.set_result(None)
+        await stop.wait()
+        try:
+            await server.cleanup()
+        except Exception as e:
+            print(f"Error stopping MCP server {server.name}: {e}")
+
+    async def _start_server(self, server: MCPServerStdio) -> None:
+        ready = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+        self._owners[server] = (asyncio.create_task(self._own(server, ready, stop)), stop)
+        await ready
+
+    async def _stop_server(self, server: MCPServerStdio) -> None:
+        owner, stop = self._owners.pop(server)
+        stop.set()
+        await owner
+
+    async def start(self) -> None:
+        """Start the shared servers, if not yet running."""
+        if self.trader_servers:
+            return
+        self.trader_servers = [self._make_server(params) for params in trader_mcp_server_params]
+        self.researcher_servers = [
+            self._make_server(params) for params in researcher_shared_mcp_server_params
+        ]
+        await asyncio.gather(
+            *[self._start_server(server) for server in self.trader_servers + self.researcher_servers]
+        )
+
+    async def _evict_idle_memory_servers(self) -> None:
+        while len(self.memory_servers) >= self.max_memory_servers:
+            idle = next((name for name in self.memory_servers if not self._memory_leases[name]), None)
+            if idle is None:
+                # Every one is in use; go over the limit until runs finish
+                return
+            server = self.memory_servers.pop(idle)
+            # A run that timed out may have left it starting
+            await asyncio.gather(self._memory_ready.pop(idle), return_exceptions=True)
+            if server in self._owners:
+                await self._stop_server(server)
+
+    async def _memory_server(self, name: str) -> MCPServerStdio:
+        async with self._memory_lock:
+            if name in self.memory_servers:
+                self.memory_servers.move_to_end(name)
+            else:
+                await self._evict_idle_memory_servers()
+                server = self._make_server(researcher_memory_mcp_server_params(name))
+                self.memory_servers[name] = server
+                self._memory_ready[name] = asyncio.create_task(self._start_server(server))
+            server, ready = self.memory_servers[name], self._memory_ready[name]
+        try:
+            await asyncio.shield(ready)
+        except Exception:
+            async with self._memory_lock:
+                if self.memory_servers.get(name) is server:
+                    del self.memory_servers[name]
+                    del self._memory_ready[name]
+                    self._owners.pop(server, None)
+            raise
+        return server
+
+    async def health_check(self) -> None:
+        """Ping every server and restart any that do not answer."""
+        for server in self._all_servers():
+            try:
+                await asyncio.wait_for(server.session.send_ping(), HEALTH_CHECK_TIMEOUT_SECONDS)
+            except Exception as e:
+                print(f"MCP server {server.name} is unhealthy ({e!r}); restarting it")
+                await self._stop_server(server)
+                server.invalidate_tools_cache()
+                try:
+                    await self._start_server(server)
+                except Exception as e:
+                    # Leave it to the next health check; runs using it will fail meanwhile
+                    print(f"Could not restart MCP server {server.name}: {e}")
+
+    @asynccontextmanager
+    async def lease(self, name: str):
+        """Yield the (trader, researcher) servers for one run of the named trader."""
+        self._memory_leases[name] += 1
+        try:
+            memory_server = await self._memory_server(name)
+            yield self.trader_servers, self.researcher_servers + [memory_server]
+        finally:
+            self._memory_leases[name] -= 1
+            if not self._memory_leases[name]:
+                del self._memory_leases[name]
+
+    async def close(self) -> None:
+        await asyncio.gather(*[self._stop_server(server) for server in list(self._owners)])
+        self.trader_servers = []
+        self.researcher_servers = []
+        self.memory_servers = OrderedDict()
+        self._memory_ready = {}
@@ -0,0 +1,314 @@
+"""
+Record and replay a trading floor's model calls and tool results.
+
+With REPLAY_MODE=record, every chat completion request made through get_model,
+every MCP tool listing, tool call and prompt, and the account reads that go into
+each prompt are appended to a cassette file (JSON lines) along with their results.
+With REPLAY_MODE=replay, the same calls are answered from the cassette instead:
+no model endpoint is contacted and the MCP servers are replaced by local stand-ins
+that serve the recorded tools and results, so a recorded cycle can be rerun
+offline, deterministically and at no cost, for benchmarks and regression tests.
+
+Calls are matched by a hash of the request, with timestamps masked since every
+prompt carries the current time. A request that has no exact match (because an
+account report differs slightly, say) falls back to the next unused recording
+of the same kind of call in recorded order: for a model, the same model,
+instructions and conversation length; for a tool, the same server and tool.
+Replaying a call that was never recorded raises ReplayMissError.
+"""
+
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable
+from dotenv import load_dotenv
+from openai.types.chat import ChatCompletion
+from mcp.types import CallToolResult, GetPromptResult, ListPromptsResult, Tool as MCPTool
+from agents.mcp import MCPServer
+from mcp_params import trader_mcp_server_params, researcher_shared_mcp_server_params
+
+load_dotenv(override=True)
+
+# "off", "record" or "replay"
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off").strip().lower()
+REPLAY_CASSETTE = os.getenv("REPLAY_CASSETTE", "replays/trading_floor.jsonl")
+
+# Create arguments that do not change what the model answers
+VOLATILE_ARGS = {"extra_headers", "extra_query", "extra_body", "timeout", "metadata", "store"}
+TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?")
+
+
+class ReplayMissError(LookupError):
+    pass
+
+
+def request_key(request: dict) -> str:
+    """ A stable hash of a request, ignoring key order and timestamps. """
+    canonical = json.dumps(request, sort_keys=True, default=str)
+    return hashlib.sha256(TIMESTAMP.sub("<time>", canonical).encode()).hexdigest()
+
+
+class Cassette:
+    """
+    The recorded calls of one or more runs, in a JSON lines file.
+
+    Each line holds the kind of call, its key, its fallback key, the request and
+    the response. Recording appends; replay loads the file once and hands each
+    recorded response out once, in recorded order among equal keys.
+    """
+
+    def __init__(self, path: str = REPLAY_CASSETTE, mode: str = REPLAY_MODE):
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._by_key: dict[str, deque[dict]] = defaultdict(deque)
+        self._by_fallback: dict[str, deque[dict]] = defaultdict(deque)
+        if mode == "replay":
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path) as f:
+            for line in f:
+                entry = json.loads(line)
+                entry["used"] = False
+                self._by_key[entry["key"]].append(entry)
+                self._by_fallback[entry["fallback"]].append(entry)
+
+    def _take(self, queue: deque[dict]) -> dict | None:
+        while queue:
+            entry = queue.popleft()
+            if not entry["used"]:
+                entry["used"] = True
+                return entry
+        return None
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+
+    async def call(
+        self,
+        kind: str,
+        request: dict,
+        fetch: Callable[[], Awaitable[Any]],
+        fallback: dict | None = None,
+        encode: Callable[[Any], Any] = lambda response: response,
+        decode: Callable[[Any], Any] = lambda response: response,
+    ) -> Any:
+        """
+        Make a call, record it, or answer it from the cassette, depending on the mode.
+
+        Args:
+            kind: The kind of call, such as "llm" or "tool"
+            request: What identifies the call; hashed for its key
+            fetch: Makes the call for real
+            fallback: What identifies the call's place in a sequence, for inexact matches
+            encode: Turns a response into JSON-serializable data for recording
+            decode: Turns recorded data back into a response
+        """
+        key = request_key({"kind": kind, **request})
+        fallback_key = request_key({"kind": kind, **(fallback or request)})
+        if self.mode == "replay":
+            entry = self._take(self._by_key[key]) or self._take(self._by_fallback[fallback_key])
+            if entry is None:
+                raise ReplayMissError(f"No recorded {kind} call matches {json.dumps(request, default=str)[:200]}")
+            return decode(entry["response"])
+        response = await fetch()
+        if self.mode == "record":
+            self._append({
+                "kind": kind,
+                "key": key,
+                "fallback": fallback_key,
+                "request": request,
+                "response": encode(response),
+            })
+        return response
+
+
+_cassette: Cassette | None = None
+
+
+def get_cassette() -> Cassette:
+    global _cassette
+    if _cassette is None:
+        _cassette = Cassette()
+    return _cassette
+
+
+def _is_omitted(value) -> bool:
+    # The openai client's NOT_GIVEN / omit sentinels
+    return type(value).__name__ in ("NotGiven", "Omit")
+
+
+class _Completions:
+    def __init__(self, client: "RecordingOpenAI"):
+        self._client = client
+
+    async def create(self, **kwargs):
+        return await self._client._create_chat_completion(**kwargs)
+
+
+class _Chat:
+    def __init__(self, client: "RecordingOpenAI"):
+        self.completions = _Completions(client)
+
+
+class RecordingOpenAI:
+    """
+    Stands in for an AsyncOpenAI client, passing chat completions through the cassette.
+
+    Only non-streamed chat completions are recorded; everything else goes to the
+    wrapped client, which may be None when replaying.
+    """
+
+    def __init__(self, client, cassette: Cassette | None = None):
+        self._client = client
+        self._cassette = cassette or get_cassette()
+        self.chat = _Chat(self)
+
+    @property
+    def base_url(self):
+        return self._client.base_url if self._client is not None else "replay://"
+
+    def with_options(self, **kwargs) -> "RecordingOpenAI":
+        client = self._client.with_options(**kwargs) if self._client is not None else None
+        return RecordingOpenAI(client, self._cassette)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def _create_chat_completion(self, **kwargs):
+        if kwargs.get("stream"):
+            if self._cassette.mode == "replay":
+                raise ReplayMissError("Streamed completions are not recorded")
+            return await self._client.chat.completions.create(**kwargs)
+        request = {
+            key: value for key, value in kwargs.items()
+            if key not in VOLATILE_ARGS and not _is_omitted(value)
+        }
+        messages = request.get("messages") or [{}]
+        fallback = {
+            "model": request.get("model"),
+            "instructions": messages[0].get("content"),
+            "turn": len(messages),
+        }
+        return await self._cassette.call(
+            "llm",
+            request,
+            lambda: self._client.chat.completions.create(**kwargs),
+            fallback=fallback,
+            encode=lambda completion: completion.model_dump(mode="json"),
+            decode=ChatCompletion.model_validate,
+        )
+
+
+class RecordingMCPServer(MCPServer):
+    """
+    An MCP server whose tool listings, tool calls and prompts pass through the cassette.
+
+    Recording wraps a real server. Replaying needs no server at all: pass None and
+    it serves the recorded tools and results without starting anything. Servers are
+    told apart by a label that is the same from run to run, since the real servers'
+    names depend on their command lines.
+    """
+
+    def __init__(self, label: str, server: MCPServer | None = None, cassette: Cassette | None = None):
+        super().__init__()
+        self.label = label
+        self.server = server
+        self.cassette = cassette or get_cassette()
+
+    @property
+    def name(self) -> str:
+        return self.server.name if self.server is not None else f"replay: {self.label}"
+
+    async def connect(self):
+        if self.server is not None:
+            await self.server.connect()
+
+    async def cleanup(self):
+        if self.server is not None:
+            await self.server.cleanup()
+
+    async def list_tools(self, run_context=None, agent=None) -> list[MCPTool]:
+        return await self.cassette.call(
+            "list_tools",
+            {"server": self.label},
+            lambda: self.server.list_tools(run_context, agent),
+            encode=lambda tools: [tool.model_dump(mode="json") for tool in tools],
+            decode=lambda tools: [MCPTool.model_validate(tool) for tool in tools],
+        )
+
+    async def call_tool(self, tool_name: str, arguments: dict[str, Any] | None, meta: dict[str, Any] | None = None) -> CallToolResult:
+        request = {"server": self.label, "tool": tool_name, "arguments": arguments}
+        if meta is not None:
+            # Only keyed when given, so calls recorded without meta still match
+            request["meta"] = meta
+        return await self.cassette.call(
+            "tool",
+            request,
+            lambda: self.server.call_tool(tool_name, arguments, meta),
+            fallback={"server": self.label, "tool": tool_name},
+            encode=lambda result: result.model_dump(mode="json"),
+            decode=CallToolResult.model_validate,
+        )
+
+    async def list_prompts(self) -> ListPromptsResult:
+        return await self.cassette.call(
+            "list_prompts",
+            {"server": self.label},
+            lambda: self.server.list_prompts(),
+            encode=lambda result: result.model_dump(mode="json"),
+            decode=ListPromptsResult.model_validate,
+        )
+
+    async def get_prompt(self, name: str, arguments: dict[str, Any] | None = None) -> GetPromptResult:
+        return await self.cassette.call(
+            "prompt",
+            {"server": self.label, "prompt": name, "arguments": arguments},
+            lambda: self.server.get_prompt(name, arguments),
+            encode=lambda result: result.model_dump(mode="json"),
+            decode=GetPromptResult.model_validate,
+        )
+
+
+def _labels(name: str) -> tuple[list[str], list[str]]:
+    # In the order of mcp_params, which both MCPServerPool.lease and Trader.run_with_mcp_servers follow
+    trader_labels = [f"trader:{index}" for index in range(len(trader_mcp_server_params))]
+    researcher_labels = [f"researcher:{index}" for index in range(len(researcher_shared_mcp_server_params))]
+    return trader_labels, researcher_labels + [f"memory:{name.lower()}"]
+
+
+def recorded_servers(
+    name: str,
+    trader_mcp_servers: list[MCPServer] | None = None,
+    researcher_mcp_servers: list[MCPServer] | None = None,
+) -> tuple[list[MCPServer], list[MCPServer]]:
+    """
+    The (trader, researcher) servers for a trader's run in the current mode:
+    the given servers when off, wrapped ones when recording, stand-ins when replaying.
+    """
+    if REPLAY_MODE == "off":
+        return trader_mcp_servers, researcher_mcp_servers
+    trader_labels, researcher_labels = _labels(name)
+    if REPLAY_MODE == "replay":
+        return (
+            [RecordingMCPServer(label) for label in trader_labels],
+            [RecordingMCPServer(label) for label in researcher_labels],
+        )
+    return (
+        [RecordingMCPServer(label, server) for label, server in zip(trader_labels, trader_mcp_servers)],
+        [RecordingMCPServer(label, server) for label, server in zip(researcher_labels, researcher_mcp_servers)],
+    )
+
+
+async def recorded_read(kind: str, name: str, fetch: Callable[[], Awaitable[str]]) -> str:
+    """ A read of account state that goes into a prompt, recorded or replayed like a tool call. """
+    if REPLAY_MODE == "off":
+        return await fetch()
+    return await get_cassette().call(kind, {"name": name.lower()}, fetch)
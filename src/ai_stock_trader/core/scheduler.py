@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+from traders import Trader, get_provider, estimate_cost
+from mcp_pool import MCPServerPool
+from metrics import timer, count, counter
+from database import add_trader_usage
+from settings import get_settings
+
+load_dotenv(override=True)
+
+# Traders calling one model provider at the same time, by default and per provider,
+# e.g. {"openai": 8, "deepseek": 2}
+MAX_CONCURRENT_TRADERS_PER_PROVIDER = int(os.getenv("MAX_CONCURRENT_TRADERS_PER_PROVIDER", "4"))
+PROVIDER_CONCURRENCY = json.loads(os.getenv("PROVIDER_CONCURRENCY", "{}"))
+# Traders running at once across all providers
+MAX_CONCURRENT_TRADERS = int(os.getenv("MAX_CONCURRENT_TRADERS", "16"))
+# Seconds between the starts of consecutive traders within a cycle
+TRADER_STAGGER_SECONDS = float(os.getenv("TRADER_STAGGER_SECONDS", "5"))
+# Seconds a trader's run may take before it is cancelled
+TRADING_TIMEOUT = get_settings().trading_timeout
+
+
+class TradingScheduler:
+    """
+    Runs the traders once per tick, at a fixed rate.
+
+    Ticks are `interval` seconds apart counted from the first one, not from the end
+    of the previous cycle, so cycles do not drift. A cycle that runs past the next
+    tick is reported as an overrun, and the ticks it missed are skipped rather than
+    run back to back.
+
+    Within a cycle, at most `max_concurrent` traders run at once and at most a
+    provider's limit of them against one model provider; each run is cancelled after
+    `trading_timeout` seconds so one stuck trader cannot hold up the cycle. Only the
+    first `max_concurrent` traders are staggered, `stagger` seconds apart: the rest
+    start as slots free up, so a long roster does not stretch the cycle by its
+    stagger.
+
+    Every run's duration, tokens and estimated cost are added to the trader's usage.
+    """
+
+    def __init__(
+        self,
+        traders: list[Trader],
+        interval: float,
+        stagger: float = TRADER_STAGGER_SECONDS,
+        provider_limits: dict[str, int] | None = None,
+        default_limit: int = MAX_CONCURRENT_TRADERS_PER_PROVIDER,
+        trading_timeout: float = TRADING_TIMEOUT,
+        max_concurrent: int = MAX_CONCURRENT_TRADERS,
+    ):
+        self.traders = traders
+        self.interval = interval
+        self.stagger = stagger
+        self.provider_limits = PROVIDER_CONCURRENCY if provider_limits is None else provider_limits
+        self.default_limit = default_limit
+        self.trading_timeout = trading_timeout
+        self.max_concurrent = max_concurrent
+        self.overruns = 0
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._running = asyncio.Semaphore(max_concurrent)
+
+    def _semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            limit = self.provider_limits.get(provider, self.default_limit)
+            self._semaphores[provider] = asyncio.Semaphore(limit)
+        return self._semaphores[provider]
+
+    def record_usage(self, trader: Trader, seconds: float, input_tokens: float, output_tokens: float) -> None:
+        name = trader.name.lower()
+        cost = estimate_cost(trader.model_name, input_tokens, output_tokens)
+        count("trader_run_seconds", seconds, trader=name)
+        count("trader_cost_usd", cost, trader=name)
+        try:
+            add_trader_usage(name, seconds, int(input_tokens), int(output_tokens), cost)
+        except Exception as e:
+            print(f"Could not record usage for {trader.name}: {e}")
+
+    async def run_trader(self, trader: Trader, delay: float, pool: MCPServerPool | None = None) -> None:
+        await asyncio.sleep(delay)
+        # The provider's slot first, so a trader waiting on its provider holds no global slot
+        async with self._semaphore(get_provider(trader.model_name)), self._running:
+            # The tracer counts tokens per trader as the run's generations end
+            name = trader.name.lower()
+            input_before = counter("trader_tokens", trader=name, kind="input")
+            output_before = counter("trader_tokens", trader=name, kind="output")
+            started = time.perf_counter()
+            try:
+                with timer("trader_run", model=trader.model_name):
+                    await asyncio.wait_for(trader.run(pool), self.trading_timeout)
+            except asyncio.TimeoutError:
+                print(f"Trader {trader.name} timed out after {self.trading_timeout:.0f}s")
+            finally:
+                self.record_usage(
+                    trader,
+                    time.perf_counter() - started,
+                    counter("trader_tokens", trader=name, kind="input") - input_before,
+                    counter("trader_tokens", trader=name, kind="output") - output_before,
+                )
+
+    async def run_cycle(self, pool: MCPServerPool | None = None) -> None:
+        """Run every trader once, staggered and within the concurrency limits."""
+        await asyncio.gather(
+            *[
+                self.run_trader(trader, min(index, self.max_concurrent - 1) * self.stagger, pool)
+                for index, trader in enumerate(self.traders)
+            ]
+        )
+
+    async def run_forever(self, cycle: Callable[[], Awaitable[None]]) -> None:
+        """Await cycle() on every tick."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            started = loop.time()
+            with timer("cycle"):
+                await cycle()
+            next_tick += self.interval
+            now = loop.time()
+            if now > next_tick:
+                missed = int((now - next_tick) // self.interval) + 1
+                self.overruns += 1
+                print(
+                    f"Cycle took {now - started:.0f}s, overrunning the {self.interval:.0f}s interval; "
+                    f"skipping {missed} tick(s)"
+                )
+                next_tick += missed * self.interval
+            await asyncio.sleep(next_tick - now)
@@ -1,11 +1,13 @@
 from contextlib import AsyncExitStack
 from accounts_client import read_accounts_resource, read_strategy_resource
 from tracers import make_trace_id
-from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, trace
+from database import write_log
+from agents import Agent, Tool, Runner, OpenAIChatCompletionsModel, ModelSettings, trace
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
 import os
 import json
+import asyncio
 from agents.mcp import MCPServerStdio
 from templates import (
     researcher_instructions,
@@ -15,6 +17,9 @@ from templates import (
     research_tool,
 )
 from mcp_params import trader_mcp_server_params, researcher_mcp_server_params
+from mcp_pool import MCPServerPool
+from replay import REPLAY_MODE, RecordingOpenAI, recorded_servers, recorded_read
+from settings import get_settings
 
 load_dotenv(override=True)
 
@@ -29,6 +34,22 @@ GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
 MAX_TURNS = 30
+# Seconds a single call to the researcher may take before the trader carries on without it
+RESEARCH_TIMEOUT = get_settings().research_timeout
+# Let models issue several tool calls per turn; the accounts server serializes them per account
+PARALLEL_TOOL_CALLS = os.getenv("PARALLEL_TOOL_CALLS", "false").strip().lower() == "true"
+# Rough characters per token, for logging prompt sizes without a tokenizer
+CHARS_PER_TOKEN = 4
+# USD per million (input, output) tokens, for estimating what each trader costs to run;
+# MODEL_PRICES adds or overrides entries, e.g. {"gpt-4o": [2.5, 10]}
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "deepseek-chat": (0.27, 1.10),
+    "gemini-2.5-flash-preview-04-17": (0.15, 0.60),
+    "grok-3-mini-beta": (0.30, 0.50),
+    **json.loads(os.getenv("MODEL_PRICES", "{}")),
+}
 
 openrouter_client = AsyncOpenAI(base_url=OPENROUTER_BASE_URL, api_key=openrouter_api_key)
 deepseek_client = AsyncOpenAI(base_url=DEEPSEEK_BASE_URL, api_key=deepseek_api_key)
@@ -36,7 +57,52 @@ grok_client = AsyncOpenAI(base_url=GROK_BASE_URL, api_key=grok_api_key)
 gemini_client = AsyncOpenAI(base_url=GEMINI_BASE_URL, api_key=google_api_key)
 
 
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def estimate_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+    """ Estimated USD for the tokens, or 0 for a model without a price. """
+    input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def get_provider(model_name: str) -> str:
+    """ The API a model is served from, following the same rules as get_model. """
+    if "/" in model_name:
+        return "openrouter"
+    elif "deepseek" in model_name:
+        return "deepseek"
+    elif "grok" in model_name:
+        return "grok"
+    elif "gemini" in model_name:
+        return "gemini"
+    else:
+        return "openai"
+
+
+def get_recording_model(model_name: str) -> OpenAIChatCompletionsModel:
+    """
+    A model whose calls are recorded to, or replayed from, the replay cassette.
+    OpenAI's own models go through Chat Completions here, like the others, rather
+    than the Responses API, so that every provider is recorded the same way.
+    """
+    clients = {
+        "openrouter": openrouter_client,
+        "deepseek": deepseek_client,
+        "grok": grok_client,
+        "gemini": gemini_client,
+    }
+    if REPLAY_MODE == "replay":
+        client = None
+    else:
+        client = clients.get(get_provider(model_name)) or AsyncOpenAI()
+    return OpenAIChatCompletionsModel(model=model_name, openai_client=RecordingOpenAI(client))
+
+
 def get_model(model_name: str):
+    if REPLAY_MODE != "off":
+        return get_recording_model(model_name)
     if "/" in model_name:
         return OpenAIChatCompletionsModel(model=model_name, openai_client=openrouter_client)
     elif "deepseek" in model_name:
@@ -61,7 +127,17 @@ async def get_researcher(mcp_servers, model_name) -> Agent:
 
 async def get_researcher_tool(mcp_servers, model_name) -> Tool:
     researcher = await get_researcher(mcp_servers, model_name)
-    return researcher.as_tool(tool_name="Researcher", tool_description=research_tool())
+    tool = researcher.as_tool(tool_name="Researcher", tool_description=research_tool())
+    invoke = tool.on_invoke_tool
+
+    async def on_invoke_tool(ctx, input: str) -> str:
+        try:
+            return await asyncio.wait_for(invoke(ctx, input), RESEARCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            return f"Research timed out after {RESEARCH_TIMEOUT:.0f} seconds; continue with what you already know."
+
+    tool.on_invoke_tool = on_invoke_tool
+    return tool
 
 
 class Trader:
@@ -80,6 +156,7 @@ class Trader:
             model=get_model(self.model_name),
             tools=[tool],
             mcp_servers=trader_mcp_servers,
+            model_settings=ModelSettings(parallel_tool_calls=True) if PARALLEL_TOOL_CALLS else ModelSettings(),
         )
         return self.agent
 
@@ -89,15 +166,26 @@ class Trader:
         account_json.pop("portfolio_value_time_series", None)
         return json.dumps(account_json)
 
-    async def run_agent(self, trader_mcp_servers, researcher_mcp_servers):
+    async def run_agent(self, trader_mcp_servers=None, researcher_mcp_servers=None):
+        trader_mcp_servers, researcher_mcp_servers = recorded_servers(
+            self.name, trader_mcp_servers, researcher_mcp_servers
+        )
         self.agent = await self.create_agent(trader_mcp_servers, researcher_mcp_servers)
-        account = await self.get_account_report()
-        strategy = await read_strategy_resource(self.name)
+        # Both reads share the accounts client's session, so they can go out together
+        account, strategy = await asyncio.gather(
+            recorded_read("account", self.name, self.get_account_report),
+            recorded_read("strategy", self.name, lambda: read_strategy_resource(self.name)),
+        )
         message = (
             trade_message(self.name, strategy, account)
             if self.do_trade
             else rebalance_message(self.name, strategy, account)
         )
+        write_log(
+            self.name,
+            "agent",
+            f"Prompt ~{estimate_tokens(message)} tokens (account report ~{estimate_tokens(account)})",
+        )
         await Runner.run(self.agent, message, max_turns=MAX_TURNS)
 
     async def run_with_mcp_servers(self):
@@ -117,15 +205,24 @@ class Trader:
                 ]
                 await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
 
-    async def run_with_trace(self):
+    async def run_with_trace(self, pool: MCPServerPool | None = None):
         trace_name = f"{self.name}-trading" if self.do_trade else f"{self.name}-rebalancing"
         trace_id = make_trace_id(f"{self.name.lower()}")
         with trace(trace_name, trace_id=trace_id):
-            await self.run_with_mcp_servers()
-
-    async def run(self):
+            if REPLAY_MODE == "replay":
+                # The recorded tool results stand in for the MCP servers
+                await self.run_agent()
+            elif pool:
+                async with pool.lease(self.name) as (trader_mcp_servers, researcher_mcp_servers):
+                    await self.run_agent(trader_mcp_servers, researcher_mcp_servers)
+            else:
+                await self.run_with_mcp_servers()
+
+    async def run(self, pool: MCPServerPool | None = None):
         try:
-            await self.run_with_trace()
+            await self.run_with_trace(pool)
         except Exception as e:
             print(f"Error running trader {self.name}: {e}")
-        self.do_trade = not self.do_trade
+        finally:
+            # Alternate even when the run is cancelled by a timeout
+            self.do_trade = not self.do_trade
@@ -4,6 +4,14 @@ import asyncio
 from tracers import LogTracer
 from agents import add_trace_processor
 from market import is_market_open
+from retention import compact_logs_if_due
+from mcp_pool import MCPServerPool
+from scheduler import TradingScheduler
+from replay import REPLAY_MODE
+from accounts_client import accounts_client
+from database import write_log
+from metrics import start_metrics_server, summary_if_due
+from roster import load_roster
 from dotenv import load_dotenv
 import os
 
@@ -13,40 +21,48 @@ RUN_EVERY_N_MINUTES = int(os.getenv("RUN_EVERY_N_MINUTES", "60"))
 RUN_EVEN_WHEN_MARKET_IS_CLOSED = (
     os.getenv("RUN_EVEN_WHEN_MARKET_IS_CLOSED", "false").strip().lower() == "true"
 )
-USE_MANY_MODELS = os.getenv("USE_MANY_MODELS", "false").strip().lower() == "true"
-
-names = ["Warren", "George", "Ray", "Cathie"]
-lastnames = ["Patience", "Bold", "Systematic", "Crypto"]
-
-if USE_MANY_MODELS:
-    model_names = [
-        "gpt-4.1-mini",
-        "deepseek-chat",
-        "gemini-2.5-flash-preview-04-17",
-        "grok-3-mini-beta",
-    ]
-    short_model_names = ["GPT 4.1 Mini", "DeepSeek V3", "Gemini 2.5 Flash", "Grok 3 Mini"]
-else:
-    model_names = ["gpt-4o-mini"] * 4
-    short_model_names = ["GPT 4o mini"] * 4
+USE_MCP_SERVER_POOL = os.getenv("USE_MCP_SERVER_POOL", "true").strip().lower() == "true"
 
 
 def create_traders() -> List[Trader]:
-    traders = []
-    for name, lastname, model_name in zip(names, lastnames, model_names):
-        traders.append(Trader(name, lastname, model_name))
-    return traders
+    return [Trader(trader.name, trader.lastname, trader.model_name) for trader in load_roster()]
 
 
 async def run_every_n_minutes():
     add_trace_processor(LogTracer())
     traders = create_traders()
-    while True:
+    scheduler = TradingScheduler(traders, RUN_EVERY_N_MINUTES * 60)
+    pool = MCPServerPool() if USE_MCP_SERVER_POOL and REPLAY_MODE != "replay" else None
+
+    async def cycle():
         if RUN_EVEN_WHEN_MARKET_IS_CLOSED or is_market_open():
-            await asyncio.gather(*[trader.run() for trader in traders])
+            if pool:
+                await pool.health_check()
+            await scheduler.run_cycle(pool)
         else:
             print("Market is closed, skipping run")
-        await asyncio.sleep(RUN_EVERY_N_MINUTES * 60)
+        await asyncio.to_thread(compact_logs_if_due)
+        summary = summary_if_due()
+        if summary:
+            write_log("metrics", "metrics", summary)
+
+    start_metrics_server()
+    try:
+        if pool:
+            await pool.start()
+        await scheduler.run_forever(cycle)
+    finally:
+        if pool:
+            await pool.close()
+        await accounts_client.close()
+
+
+class TradingFloor:
+    """ Entry point used by `python -m ai_stock_trader --mode trading`. """
+
+    async def run(self):
+        print(f"Starting scheduler to run every {RUN_EVERY_N_MINUTES} minutes")
+        await run_every_n_minutes()
 
 
 if __name__ == "__main__":
@@ -3,7 +3,17 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime
 import random
-from database import write_market, read_market
+import time
+from database import (
+    write_market_prices,
+    has_market_prices,
+    read_market_price,
+    read_market_prices,
+    write_quotes,
+    read_quotes,
+)
+from quote_cache import QuoteCache
+from metrics import timed
 from functools import lru_cache
 from datetime import timezone
 
@@ -15,6 +25,21 @@ polygon_plan = os.getenv("POLYGON_PLAN")
 is_paid_polygon = polygon_plan == "paid"
 is_realtime_polygon = polygon_plan == "realtime"
 
+MARKET_DATA_CACHE_TTL = int(os.getenv("MARKET_DATA_CACHE_TTL", "300"))
+QUOTE_CACHE_STALE_TTL = int(os.getenv("QUOTE_CACHE_STALE_TTL", str(MARKET_DATA_CACHE_TTL * 4)))
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "2048"))
+QUOTE_CACHE_SHARED = os.getenv("QUOTE_CACHE_SHARED", "true").strip().lower() == "true"
+
+# Intraday quotes, shared by every caller in this process and, through the quotes
+# table, with the market and accounts servers of every other trader
+quote_cache = QuoteCache(
+    MARKET_DATA_CACHE_TTL,
+    QUOTE_CACHE_SIZE,
+    QUOTE_CACHE_STALE_TTL,
+    shared_read=read_quotes if QUOTE_CACHE_SHARED else None,
+    shared_write=write_quotes if QUOTE_CACHE_SHARED else None,
+)
+
 
 def is_market_open() -> bool:
     client = RESTClient(polygon_api_key)
@@ -22,44 +47,73 @@ def is_market_open() -> bool:
     return market_status.market == "open"
 
 
-def get_all_share_prices_polygon_eod() -> dict[str, float]:
+@timed("price_fetch")
+def get_all_share_bars_polygon_eod() -> list[tuple]:
     client = RESTClient(polygon_api_key)
 
     probe = client.get_previous_close_agg("SPY")[0]
     last_close = datetime.fromtimestamp(probe.timestamp / 1000, tz=timezone.utc).date()
 
     results = client.get_grouped_daily_aggs(last_close, adjusted=True, include_otc=False)
-    return {result.ticker: result.close for result in results}
+    return [
+        (result.ticker, result.open, result.high, result.low, result.close, result.volume)
+        for result in results
+    ]
 
 
 @lru_cache(maxsize=2)
-def get_market_for_prior_date(today):
-    market_data = read_market(today)
-    if not market_data:
-        market_data = get_all_share_prices_polygon_eod()
-        write_market(today, market_data)
-    return market_data
+def load_market_for_prior_date(today) -> str:
+    """Make sure the prior close for every ticker is stored under `today`, fetching it once."""
+    if not has_market_prices(today):
+        write_market_prices(today, get_all_share_bars_polygon_eod())
+    return today
 
 
 def get_share_price_polygon_eod(symbol) -> float:
-    today = datetime.now().date().strftime("%Y-%m-%d")
-    market_data = get_market_for_prior_date(today)
-    return market_data.get(symbol, 0.0)
+    today = load_market_for_prior_date(datetime.now().date().strftime("%Y-%m-%d"))
+    return read_market_price(today, symbol) or 0.0
+
 
+def get_share_prices_polygon_eod(symbols: list[str]) -> dict[str, float]:
+    today = load_market_for_prior_date(datetime.now().date().strftime("%Y-%m-%d"))
+    prices = read_market_prices(today, symbols)
+    return {symbol: prices.get(symbol) or 0.0 for symbol in symbols}
 
+
+@timed("price_fetch")
 def get_share_price_polygon_min(symbol) -> float:
     client = RESTClient(polygon_api_key)
     result = client.get_snapshot_ticker("stocks", symbol)
     return result.min.close or result.prev_day.close
 
 
+@timed("price_fetch")
+def get_share_prices_polygon_min(symbols: list[str]) -> dict[str, float]:
+    """Price every symbol from one all-tickers snapshot request, filtered to `symbols`."""
+    client = RESTClient(polygon_api_key)
+    results = client.get_snapshot_all("stocks", tickers=symbols)
+    prices = {
+        result.ticker: (result.min.close if result.min else None) or result.prev_day.close
+        for result in results
+    }
+    return {symbol: prices.get(symbol, 0.0) for symbol in symbols}
+
+
 def get_share_price_polygon(symbol) -> float:
     if is_paid_polygon:
-        return get_share_price_polygon_min(symbol)
+        return quote_cache.get(symbol, get_share_price_polygon_min)
     else:
         return get_share_price_polygon_eod(symbol)
 
 
+def get_share_prices_polygon(symbols: list[str]) -> dict[str, float]:
+    if is_paid_polygon:
+        return quote_cache.get_many(symbols, get_share_prices_polygon_min)
+    else:
+        return get_share_prices_polygon_eod(symbols)
+
+
+@timed("price_lookup")
 def get_share_price(symbol) -> float:
     if polygon_api_key:
         try:
@@ -67,3 +121,35 @@ def get_share_price(symbol) -> float:
         except Exception as e:
             print(f"Was not able to use the polygon API due to {e}; using a random number")
     return float(random.randint(1, 100))
+
+
+@timed("price_lookup")
+def get_share_prices(symbols: list[str]) -> dict[str, float]:
+    """Return the price of each symbol, using a single market data request for all of them."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    if polygon_api_key:
+        try:
+            return get_share_prices_polygon(symbols)
+        except Exception as e:
+            print(f"Was not able to use the polygon API due to {e}; using random numbers")
+    return {symbol: float(random.randint(1, 100)) for symbol in symbols}
+
+
+def get_price_epoch():
+    """
+    Return a value that stays the same for as long as share prices cannot have changed,
+    or None when every lookup may return a new price (the random fallback).
+    """
+    if not polygon_api_key:
+        return None
+    if is_paid_polygon:
+        # Changes when a fetched price differs, and at least once per TTL so that
+        # callers caching on it still go back to the quote cache to refresh it
+        return (quote_cache.epoch, int(time.time() // MARKET_DATA_CACHE_TTL))
+    return datetime.now().date().strftime("%Y-%m-%d")
+
+
+def get_quote_cache_stats() -> dict[str, float]:
+    return quote_cache.stats()
@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+SharedRead = Callable[[list[str]], dict[str, tuple[float, float]]]
+SharedWrite = Callable[[dict[str, float], float], None]
+
+
+class QuoteCache:
+    """
+    In-memory share price cache shared by everything in the process.
+
+    Prices younger than `ttl` seconds are served as-is. Prices that are older but
+    still within `stale_ttl` are served immediately while a background thread
+    refetches them (stale-while-revalidate), so callers only wait on the network
+    for symbols they have never seen or that have gone fully stale. The cache holds
+    at most `max_size` symbols and evicts the least recently used.
+
+    Optionally the cache reads through a store shared with other processes:
+    `shared_read(symbols)` returns {symbol: (price, fetched_at)} and
+    `shared_write(prices, fetched_at)` publishes fresh fetches, so one fetch by any
+    process serves all of them. Ages are wall-clock seconds for that reason.
+
+    `epoch` goes up whenever a symbol is cached for the first time or its price
+    changes, so anything derived from cached prices can tell when to recompute.
+
+    All state is guarded by a lock that is never held across a fetch, so it is safe
+    to call from worker threads and from coroutines on the event loop alike.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_size: int = 1024,
+        stale_ttl: float | None = None,
+        shared_read: SharedRead | None = None,
+        shared_write: SharedWrite | None = None,
+    ):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else ttl * 4
+        self.max_size = max_size
+        self.shared_read = shared_read
+        self.shared_write = shared_write
+        self._entries: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._refreshing: set[str] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.epoch = 0
+
+    def get(self, symbol: str, fetch: Callable[[str], float]) -> float:
+        """Return the price of one symbol, calling fetch(symbol) on a miss."""
+        return self.get_many([symbol], lambda symbols: {symbols[0]: fetch(symbols[0])})[symbol]
+
+    def get_many(
+        self, symbols: list[str], fetch: Callable[[list[str]], dict[str, float]]
+    ) -> dict[str, float]:
+        """Return prices for all symbols, calling fetch once with just the misses."""
+        now = time.time()
+        prices, missing, stale = {}, [], []
+        with self._lock:
+            for symbol in symbols:
+                entry = self._entries.get(symbol)
+                age = now - entry[1] if entry else None
+                if entry is None or age > self.stale_ttl:
+                    missing.append(symbol)
+                    continue
+                prices[symbol] = entry[0]
+                self._entries.move_to_end(symbol)
+                if age <= self.ttl:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    stale.append(symbol)
+        if missing and self.shared_read:
+            for symbol, (price, fetched_at) in self.shared_read(missing).items():
+                age = now - fetched_at
+                if age > self.stale_ttl:
+                    continue
+                prices[symbol] = price
+                self._put(symbol, price, fetched_at)
+                with self._lock:
+                    self.shared_hits += 1
+                if age > self.ttl:
+                    stale.append(symbol)
+            missing = [symbol for symbol in missing if symbol not in prices]
+        self._schedule_refresh(stale, fetch)
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            fetched = fetch(missing)
+            self.put_many(fetched, publish=True)
+            prices.update(fetched)
+        return prices
+
+    def put_many(self, prices: dict[str, float], publish: bool = False) -> None:
+        """Cache freshly fetched prices, also writing them to the shared store if `publish`."""
+        now = time.time()
+        for symbol, price in prices.items():
+            self._put(symbol, price, now)
+        if publish and self.shared_write and prices:
+            self.shared_write(prices, now)
+
+    def _put(self, symbol: str, price: float, fetched_at: float) -> None:
+        with self._lock:
+            previous = self._entries.get(symbol)
+            if previous is None or previous[0] != price:
+                self.epoch += 1
+            self._entries[symbol] = (price, fetched_at)
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _schedule_refresh(self, symbols: list[str], fetch: Callable[[list[str]], dict[str, float]]) -> None:
+        with self._lock:
+            symbols = [symbol for symbol in symbols if symbol not in self._refreshing]
+            self._refreshing.update(symbols)
+        if symbols:
+            self._executor.submit(self._refresh, symbols, fetch)
+
+    def _refresh(self, symbols: list[str], fetch: Callable[[list[str]], dict[str, float]]) -> None:
+        try:
+            to_fetch = list(symbols)
+            # Another process may have refreshed some of these already
+            if self.shared_read:
+                now = time.time()
+                for symbol, (price, fetched_at) in self.shared_read(symbols).items():
+                    if now - fetched_at <= self.ttl:
+                        self._put(symbol, price, fetched_at)
+                        to_fetch.remove(symbol)
+            if to_fetch:
+                self.put_many(fetch(to_fetch), publish=True)
+        except Exception as e:
+            print(f"Failed to refresh prices for {symbols}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(symbols)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, float]:
+        """Counters for monitoring; hit_ratio counts stale and shared hits as hits."""
+        with self._lock:
+            hits = self.hits + self.stale_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "epoch": self.epoch,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+            }
@@ -1,17 +1,336 @@
 import sqlite3
 import json
-from datetime import datetime
+import os
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from metrics import timed
 
 load_dotenv(override=True)
 
 DB = "accounts.db"
 
+# Connection tuning; see get_connection
+BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+STATEMENT_CACHE_SIZE = 256
 
-with sqlite3.connect(DB) as conn:
-    cursor = conn.cursor()
-    cursor.execute('CREATE TABLE IF NOT EXISTS accounts (name TEXT PRIMARY KEY, account TEXT)')
+# Raw portfolio valuation points kept per account; older ones are only in the rollups
+PORTFOLIO_VALUES_MAX_RAW_POINTS = int(os.getenv("PORTFOLIO_VALUES_MAX_RAW_POINTS", "1000"))
+# strftime formats of the fixed-width buckets the valuation points are rolled up into
+ROLLUP_RESOLUTIONS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
+_local = threading.local()
+
+
+class StaleAccountError(Exception):
+    """ Raised when an account was changed by another writer since it was read. """
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the calling thread's connection to the database, opening it on first use.
+
+    Connections are kept for the life of the thread (and reopened after a fork), so
+    the per-connection statement cache turns the fixed SQL strings used below into
+    prepared statements that are compiled once. Each connection runs in autocommit
+    mode with WAL journaling, so readers such as the dashboard never block writers,
+    and waits up to BUSY_TIMEOUT_MS for a competing writer instead of failing with
+    "database is locked".
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid():
+        conn = sqlite3.connect(
+            DB,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        # Only takes effect on a new, empty database; see vacuum() for existing ones
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.depth = 0
+        _local.after_commit = []
+    return conn
+
+
+@contextmanager
+def transaction(immediate: bool = True):
+    """
+    Run the enclosed statements in a single transaction on the thread's connection.
+
+    Nested uses join the outermost transaction, which commits on success and rolls
+    back if the block raises. Writers take the write lock up front (BEGIN IMMEDIATE)
+    so concurrent writers queue on busy_timeout rather than deadlocking on upgrade;
+    pass immediate=False for a read-only snapshot. Callbacks registered with
+    after_commit run once the outermost transaction has committed.
+    """
+    conn = get_connection()
+    if _local.depth == 0:
+        conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+        _local.after_commit = []
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            _local.after_commit = []
+            conn.execute('ROLLBACK')
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.execute('COMMIT')
+        callbacks, _local.after_commit = _local.after_commit, []
+        for callback in callbacks:
+            callback()
+
+
+def after_commit(callback) -> None:
+    """
+    Run callback once the thread's open transaction commits, or at once if none is open.
+
+    Callbacks are dropped if the transaction rolls back, so state kept alongside the
+    database (what has been saved, cached reads) only moves on with what was stored.
+    """
+    get_connection()
+    if _local.depth == 0:
+        callback()
+    else:
+        _local.after_commit.append(callback)
+
+
+def _migrate_legacy_accounts(conn: sqlite3.Connection) -> None:
+    """
+    Move accounts stored as a single JSON blob per row into the normalized tables.
+
+    Older databases have `accounts (name, account)` where `account` holds the whole
+    `Account.model_dump()`. The blobs are unpacked into `accounts`, `holdings`,
+    `transactions` and `portfolio_values` in a single transaction.
+    """
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(accounts)')]
+    if 'account' not in columns:
+        return
+    with transaction():
+        conn.execute('ALTER TABLE accounts RENAME TO accounts_legacy')
+        _create_account_tables(conn)
+        for name, blob in conn.execute('SELECT name, account FROM accounts_legacy').fetchall():
+            _insert_account(conn, name, json.loads(blob))
+        conn.execute('DROP TABLE accounts_legacy')
+
+
+def _migrate_legacy_market(conn: sqlite3.Connection) -> None:
+    """
+    Unpack the old `market (date, data)` table, which held each day's closes as one
+    JSON object, into `market_prices` rows. Only closes were stored, so the other
+    columns of migrated rows are NULL.
+    """
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'market'").fetchone():
+        return
+    with transaction():
+        for date, data in conn.execute('SELECT date, data FROM market').fetchall():
+            conn.executemany(
+                'INSERT OR IGNORE INTO market_prices (date, ticker, close) VALUES (?, ?, ?)',
+                [(date, ticker, close) for ticker, close in json.loads(data).items()],
+            )
+        conn.execute('DROP TABLE market')
+
+
+def _create_account_tables(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            balance REAL NOT NULL,
+            strategy TEXT NOT NULL DEFAULT '',
+            net_invested REAL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Columns added after the table was introduced. net_invested is NULL until the
+    # account's positions are rebuilt from its history; version counts its mutations
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(accounts)')}
+    if 'net_invested' not in columns:
+        conn.execute('ALTER TABLE accounts ADD COLUMN net_invested REAL')
+    if 'version' not in columns:
+        conn.execute('ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (name, symbol)
+        )
+    ''')
+    # Running cost basis and realized P&L per symbol, kept for closed positions too
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS positions (
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            cost_basis REAL NOT NULL,
+            realized_pnl REAL NOT NULL,
+            PRIMARY KEY (name, symbol)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            symbol TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            price REAL NOT NULL,
+            timestamp TEXT NOT NULL,
+            rationale TEXT NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_transactions_name ON transactions (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_values (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            value REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_portfolio_values_name ON portfolio_values (name, id)')
+    _create_rollup_table(conn)
+
+
+def _create_rollup_table(conn: sqlite3.Connection) -> None:
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'portfolio_value_rollups'"
+    ).fetchone()
+    # Last, lowest and highest value per account, resolution and fixed-width time bucket
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS portfolio_value_rollups (
+            name TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            value REAL NOT NULL,
+            low REAL NOT NULL,
+            high REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (name, resolution, bucket)
+        ) WITHOUT ROWID
+    ''')
+    if not exists:
+        # Backfill from the raw points already stored
+        for resolution, bucket_format in ROLLUP_RESOLUTIONS.items():
+            conn.execute('''
+                INSERT INTO portfolio_value_rollups (name, resolution, bucket, value, low, high, count)
+                SELECT g.name, ?, g.bucket, p.value, g.low, g.high, g.count
+                FROM (
+                    SELECT name, strftime(?, datetime) AS bucket, max(id) AS last_id,
+                           min(value) AS low, max(value) AS high, count(*) AS count
+                    FROM portfolio_values
+                    GROUP BY name, bucket
+                ) g
+                JOIN portfolio_values p ON p.id = g.last_id
+            ''', (resolution, bucket_format))
+
+
+def _upsert_account_state(
+    cursor, name, balance, strategy, holdings, net_invested=None, positions=None, version=0, expected_version=None
+):
+    if expected_version is None:
+        cursor.execute('''
+            INSERT INTO accounts (name, balance, strategy, net_invested, version)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                balance=excluded.balance,
+                strategy=excluded.strategy,
+                net_invested=excluded.net_invested,
+                version=excluded.version
+        ''', (name, balance, strategy, net_invested, version))
+    else:
+        # Compare-and-swap: only overwrite the state the caller read
+        updated = cursor.execute('''
+            UPDATE accounts SET balance = ?, strategy = ?, net_invested = ?, version = ?
+            WHERE name = ? AND version = ?
+        ''', (balance, strategy, net_invested, version, name, expected_version))
+        if updated.rowcount == 0:
+            raise StaleAccountError(
+                f"Account {name} has changed since version {expected_version} was read"
+            )
+    cursor.execute('DELETE FROM holdings WHERE name = ?', (name,))
+    cursor.executemany(
+        'INSERT INTO holdings (name, symbol, quantity) VALUES (?, ?, ?)',
+        [(name, symbol, quantity) for symbol, quantity in holdings.items()],
+    )
+    cursor.execute('DELETE FROM positions WHERE name = ?', (name,))
+    cursor.executemany(
+        'INSERT INTO positions (name, symbol, quantity, cost_basis, realized_pnl) VALUES (?, ?, ?, ?, ?)',
+        [
+            (name, symbol, p["quantity"], p["cost_basis"], p["realized_pnl"])
+            for symbol, p in (positions or {}).items()
+        ],
+    )
+
+
+def _append_history(cursor, name, transactions, portfolio_values):
+    """ Insert new transactions and valuation points, rolling the points up and capping the raw ones. """
+    cursor.executemany('''
+        INSERT INTO transactions (name, symbol, quantity, price, timestamp, rationale)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (name, t["symbol"], t["quantity"], t["price"], t["timestamp"], t["rationale"])
+        for t in transactions
+    ])
+    cursor.executemany(
+        'INSERT INTO portfolio_values (name, datetime, value) VALUES (?, ?, ?)',
+        [(name, timestamp, value) for timestamp, value in portfolio_values],
+    )
+    if not portfolio_values:
+        return
+    for resolution, bucket_format in ROLLUP_RESOLUTIONS.items():
+        cursor.executemany('''
+            INSERT INTO portfolio_value_rollups (name, resolution, bucket, value, low, high, count)
+            VALUES (?, ?, strftime(?, ?), ?, ?, ?, 1)
+            ON CONFLICT(name, resolution, bucket) DO UPDATE SET
+                value = excluded.value,
+                low = min(low, excluded.low),
+                high = max(high, excluded.high),
+                count = count + 1
+        ''', [
+            (name, resolution, bucket_format, timestamp, value, value, value)
+            for timestamp, value in portfolio_values
+        ])
+    # Older raw points survive only in the rollups
     cursor.execute('''
+        DELETE FROM portfolio_values WHERE name = ? AND id <= (
+            SELECT id FROM portfolio_values WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?
+        )
+    ''', (name, name, PORTFOLIO_VALUES_MAX_RAW_POINTS))
+
+
+def _insert_account(cursor, name, account_dict, expected_version=None):
+    _upsert_account_state(
+        cursor,
+        name,
+        account_dict["balance"],
+        account_dict["strategy"],
+        account_dict["holdings"],
+        account_dict.get("net_invested"),
+        account_dict.get("positions"),
+        account_dict.get("version", 0),
+        expected_version,
+    )
+    _append_history(
+        cursor, name, account_dict["transactions"], account_dict["portfolio_value_time_series"]
+    )
+
+
+with transaction() as conn:
+    _migrate_legacy_accounts(conn)
+    _create_account_tables(conn)
+    conn.execute('''
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT,
@@ -20,27 +339,268 @@ with sqlite3.connect(DB) as conn:
             message TEXT
         )
     ''')
-    cursor.execute('CREATE TABLE IF NOT EXISTS market (date TEXT PRIMARY KEY, data TEXT)')
-    conn.commit()
+    # Serves both the latest-N and since-id reads. Every writer stamps datetime('now')
+    # as it inserts, and inserts are serialized by the write lock, so ids increase with datetime
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_logs_name_id ON logs (name, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS market_prices (
+            date TEXT NOT NULL,
+            ticker TEXT NOT NULL,
+            open REAL,
+            high REAL,
+            low REAL,
+            close REAL,
+            volume REAL,
+            PRIMARY KEY (date, ticker)
+        ) WITHOUT ROWID
+    ''')
+    _migrate_legacy_market(conn)
+    conn.execute('CREATE TABLE IF NOT EXISTS quotes (symbol TEXT PRIMARY KEY, price REAL NOT NULL, fetched_at REAL NOT NULL)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS traders (
+            name TEXT PRIMARY KEY COLLATE NOCASE,
+            lastname TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            short_model_name TEXT NOT NULL,
+            strategy TEXT NOT NULL,
+            enabled INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    # Per trader and day, so accounting costs one row per run regardless of history
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS trader_usage (
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            runs INTEGER NOT NULL DEFAULT 0,
+            seconds REAL NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, date)
+        ) WITHOUT ROWID
+    ''')
 
-def write_account(name, account_dict):
-    json_data = json.dumps(account_dict)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO accounts (name, account)
-            VALUES (?, ?)
-            ON CONFLICT(name) DO UPDATE SET account=excluded.account
-        ''', (name.lower(), json_data))
-        conn.commit()
 
+@timed("db_write")
+def write_account(name, account_dict, expected_version=None):
+    """
+    Replace the stored account, including its full transaction and valuation history.
+
+    Used when an account is created or reset; routine saves go through
+    `write_account_changes`, which only appends new history. If expected_version
+    is given, raises StaleAccountError unless the stored account is at that version.
+    """
+    name = name.lower()
+    with transaction() as conn:
+        if expected_version is not None:
+            # Check first so a stale write leaves the history alone
+            _upsert_account_state(
+                conn, name, account_dict["balance"], account_dict["strategy"], {},
+                version=account_dict.get("version", 0), expected_version=expected_version,
+            )
+        conn.execute('DELETE FROM transactions WHERE name = ?', (name,))
+        conn.execute('DELETE FROM portfolio_values WHERE name = ?', (name,))
+        conn.execute('DELETE FROM portfolio_value_rollups WHERE name = ?', (name,))
+        _insert_account(conn, name, account_dict)
+
+
+@timed("db_write")
+def write_account_changes(
+    name,
+    balance,
+    strategy,
+    holdings,
+    transactions,
+    portfolio_values,
+    net_invested=None,
+    positions=None,
+    version=0,
+    expected_version=None,
+):
+    """
+    Persist the current state of an account and append new history rows.
+
+    Args:
+        name (str): The account name
+        balance (float): The cash balance
+        strategy (str): The investment strategy
+        holdings (dict): Symbol to quantity for every open position
+        transactions (list): Transaction dicts recorded since the last save
+        portfolio_values (list): (datetime, value) points recorded since the last save
+        net_invested (float): Cash spent on purchases less sale proceeds, over all transactions
+        positions (dict): Symbol to quantity, cost_basis and realized_pnl for every symbol traded
+        version (int): The account's mutation count
+        expected_version (int): If given, the version the changes were made from; raises
+            StaleAccountError, writing nothing, if the stored account is at another one
+    """
+    name = name.lower()
+    with transaction() as conn:
+        _upsert_account_state(
+            conn, name, balance, strategy, holdings, net_invested, positions, version, expected_version
+        )
+        _append_history(conn, name, transactions, portfolio_values)
+
+
+@timed("db_read")
 def read_account(name):
-    with sqlite3.connect(DB) as conn:
+    name = name.lower()
+    # One transaction so the account and its history are read from the same snapshot
+    with transaction(immediate=False) as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT account FROM accounts WHERE name = ?', (name.lower(),))
+        cursor.execute('SELECT balance, strategy, net_invested, version FROM accounts WHERE name = ?', (name,))
         row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
-    
+        if not row:
+            return None
+        balance, strategy, net_invested, version = row
+        cursor.execute('SELECT symbol, quantity FROM holdings WHERE name = ?', (name,))
+        holdings = dict(cursor.fetchall())
+        cursor.execute(
+            'SELECT symbol, quantity, cost_basis, realized_pnl FROM positions WHERE name = ?', (name,)
+        )
+        positions = {
+            symbol: {"quantity": quantity, "cost_basis": cost_basis, "realized_pnl": realized_pnl}
+            for symbol, quantity, cost_basis, realized_pnl in cursor.fetchall()
+        }
+        cursor.execute('''
+            SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+            WHERE name = ?
+            ORDER BY id
+        ''', (name,))
+        transactions = [
+            {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": timestamp, "rationale": rationale}
+            for symbol, quantity, price, timestamp, rationale in cursor.fetchall()
+        ]
+        cursor.execute('SELECT datetime, value FROM portfolio_values WHERE name = ? ORDER BY id', (name,))
+        portfolio_values = [tuple(row) for row in cursor.fetchall()]
+        return {
+            "name": name,
+            "balance": balance,
+            "strategy": strategy,
+            "holdings": holdings,
+            "transactions": transactions,
+            "portfolio_value_time_series": portfolio_values,
+            # None for accounts saved before positions were tracked
+            "net_invested": net_invested,
+            "positions": positions if net_invested is not None else None,
+            "version": version,
+        }
+
+@timed("db_read")
+def read_balance(name):
+    """ Return an account's cash balance, or None if there is no such account. """
+    row = get_connection().execute(
+        'SELECT balance FROM accounts WHERE name = ?', (name.lower(),)
+    ).fetchone()
+    return row[0] if row else None
+
+
+@timed("db_read")
+def read_strategy(name):
+    """ Return an account's strategy, or None if there is no such account. """
+    row = get_connection().execute(
+        'SELECT strategy FROM accounts WHERE name = ?', (name.lower(),)
+    ).fetchone()
+    return row[0] if row else None
+
+
+@timed("db_read")
+def read_holdings(name):
+    """ Return an account's holdings as {symbol: quantity}; empty for an unknown account. """
+    return dict(get_connection().execute(
+        'SELECT symbol, quantity FROM holdings WHERE name = ?', (name.lower(),)
+    ).fetchall())
+
+
+@timed("db_read")
+def read_transactions(name, last_n=10):
+    """ Return an account's last_n transactions as dicts, oldest first. """
+    rows = get_connection().execute('''
+        SELECT symbol, quantity, price, timestamp, rationale FROM transactions
+        WHERE name = ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n)).fetchall()
+    return [
+        {"symbol": symbol, "quantity": quantity, "price": price, "timestamp": timestamp, "rationale": rationale}
+        for symbol, quantity, price, timestamp, rationale in reversed(rows)
+    ]
+
+
+@timed("db_read")
+def read_account_summary(name):
+    """
+    Return an account's current state without its history, or None if there is no such account.
+
+    The dict has name, balance, strategy, holdings, net_invested and positions (as in
+    read_account) and the latest (datetime, value) point.
+    """
+    name = name.lower()
+    with transaction(immediate=False) as conn:
+        row = conn.execute(
+            'SELECT balance, strategy, net_invested FROM accounts WHERE name = ?', (name,)
+        ).fetchone()
+        if not row:
+            return None
+        balance, strategy, net_invested = row
+        positions = {
+            symbol: {"quantity": quantity, "cost_basis": cost_basis, "realized_pnl": realized_pnl}
+            for symbol, quantity, cost_basis, realized_pnl in conn.execute(
+                'SELECT symbol, quantity, cost_basis, realized_pnl FROM positions WHERE name = ?', (name,)
+            )
+        }
+        latest_value = conn.execute(
+            'SELECT datetime, value FROM portfolio_values WHERE name = ? ORDER BY id DESC LIMIT 1', (name,)
+        ).fetchone()
+        return {
+            "name": name,
+            "balance": balance,
+            "strategy": strategy,
+            "holdings": read_holdings(name),
+            "net_invested": net_invested,
+            "positions": positions if net_invested is not None else None,
+            "latest_value": tuple(latest_value) if latest_value else None,
+        }
+
+
+@timed("db_read")
+def read_portfolio_values(name, resolution="raw", since=None):
+    """
+    Return an account's (datetime, value) points, oldest first.
+
+    Args:
+        name (str): The account name
+        resolution (str): "raw" for the stored points, or a key of ROLLUP_RESOLUTIONS
+            for the last value in each bucket
+        since (str): Only points at or after this datetime, if given
+    """
+    name = name.lower()
+    since = since or ""
+    conn = get_connection()
+    if resolution == "raw":
+        rows = conn.execute('''
+            SELECT datetime, value FROM portfolio_values
+            WHERE name = ? AND datetime >= ?
+            ORDER BY id
+        ''', (name, since)).fetchall()
+    else:
+        rows = conn.execute('''
+            SELECT bucket, value FROM portfolio_value_rollups
+            WHERE name = ? AND resolution = ? AND bucket >= strftime(?, ?)
+            ORDER BY bucket
+        ''', (name, resolution, ROLLUP_RESOLUTIONS[resolution], since or "0000-01-01")).fetchall()
+    return [tuple(row) for row in rows]
+
+
+@timed("db_read")
+def count_portfolio_values(name, resolution, since=None):
+    """ Return how many points read_portfolio_values would return for a rollup resolution. """
+    return get_connection().execute('''
+        SELECT count(*) FROM portfolio_value_rollups
+        WHERE name = ? AND resolution = ? AND bucket >= strftime(?, ?)
+    ''', (name.lower(), resolution, ROLLUP_RESOLUTIONS[resolution], since or "0000-01-01")).fetchone()[0]
+
+
+@timed("db_write")
 def write_log(name: str, type: str, message: str):
     """
     Write a log entry to the logs table.
@@ -50,16 +610,30 @@ def write_log(name: str, type: str, message: str):
         type (str): The type of log entry
         message (str): The log message
     """
-    now = datetime.now().isoformat()
-    
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
+    conn = get_connection()
+    conn.execute('''
+        INSERT INTO logs (name, datetime, type, message)
+        VALUES (?, datetime('now'), ?, ?)
+    ''', (name.lower(), type, message))
+
+@timed("db_write")
+def write_logs(records: list[tuple[str, str, str]]):
+    """
+    Write a batch of log entries to the logs table in a single transaction.
+
+    Entries are stamped with the time they are inserted, like write_log's, so that
+    id order stays time order however long they were queued.
+
+    Args:
+        records (list): Tuples of (name, type, message)
+    """
+    with transaction() as conn:
+        conn.executemany('''
             INSERT INTO logs (name, datetime, type, message)
             VALUES (?, datetime('now'), ?, ?)
-        ''', (name.lower(), type, message))
-        conn.commit()
+        ''', [(name.lower(), type, message) for name, type, message in records])
 
+@timed("db_read")
 def read_log(name: str, last_n=10):
     """
     Read the most recent log entries for a given name.
@@ -71,31 +645,264 @@ def read_log(name: str, last_n=10):
     Returns:
         list: A list of tuples containing (datetime, type, message)
     """
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT datetime, type, message FROM logs 
-            WHERE name = ? 
-            ORDER BY datetime DESC
-            LIMIT ?
-        ''', (name.lower(), last_n))
-        
-        return reversed(cursor.fetchall())
+    cursor = get_connection().execute('''
+        SELECT datetime, type, message FROM logs 
+        WHERE name = ? 
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_n))
 
-def write_market(date: str, data: dict) -> None:
-    data_json = json.dumps(data)
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO market (date, data)
-            VALUES (?, ?)
-            ON CONFLICT(date) DO UPDATE SET data=excluded.data
-        ''', (date, data_json))
-        conn.commit()
-
-def read_market(date: str) -> dict | None:
-    with sqlite3.connect(DB) as conn:
-        cursor = conn.cursor()
-        cursor.execute('SELECT data FROM market WHERE date = ?', (date,))
-        row = cursor.fetchone()
-        return json.loads(row[0]) if row else None
\ No newline at end of file
+    return reversed(cursor.fetchall())
+
+@timed("db_read")
+def read_log_since(name: str, last_id: int = 0, last_n=10):
+    """
+    Read log entries for a given name that were written after a known entry.
+
+    Args:
+        name (str): The name to retrieve logs for
+        last_id (int): The id of the newest entry the caller already has
+        last_n (int): Maximum number of entries to return; the newest are kept
+
+    Returns:
+        list: Tuples of (id, datetime, type, message), oldest first
+    """
+    cursor = get_connection().execute('''
+        SELECT id, datetime, type, message FROM logs
+        WHERE name = ? AND id > ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (name.lower(), last_id, last_n))
+
+    return cursor.fetchall()[::-1]
+
+@timed("db_read")
+def read_log_names() -> list[str]:
+    return [row[0] for row in get_connection().execute('SELECT DISTINCT name FROM logs')]
+
+@timed("db_read")
+def last_log_id_to_archive(name: str, cutoff: str, max_rows: int) -> int | None:
+    """
+    Find the newest log entry for a name that falls outside its retention policy.
+
+    Args:
+        name (str): The name whose logs are being compacted
+        cutoff (str): Entries written before this UTC datetime have expired
+        max_rows (int): Number of most recent entries to keep regardless of age
+
+    Returns:
+        int | None: The id through which entries can be archived, or None if none can
+    """
+    conn = get_connection()
+    over_cap = conn.execute(
+        'SELECT id FROM logs WHERE name = ? ORDER BY id DESC LIMIT 1 OFFSET ?', (name, max_rows)
+    ).fetchone()
+    expired = conn.execute(
+        'SELECT MAX(id) FROM logs WHERE name = ? AND datetime < ?', (name, cutoff)
+    ).fetchone()
+    ids = [row[0] for row in (over_cap, expired) if row and row[0] is not None]
+    return max(ids) if ids else None
+
+@timed("db_read")
+def read_logs_through(name: str, through_id: int, limit: int) -> list[tuple]:
+    """Return up to `limit` of the oldest entries for a name with id <= through_id, as full rows."""
+    return get_connection().execute('''
+        SELECT id, name, datetime, type, message FROM logs
+        WHERE name = ? AND id <= ?
+        ORDER BY id
+        LIMIT ?
+    ''', (name, through_id, limit)).fetchall()
+
+@timed("db_write")
+def delete_logs_through(name: str, through_id: int) -> None:
+    get_connection().execute('DELETE FROM logs WHERE name = ? AND id <= ?', (name, through_id))
+
+def vacuum() -> None:
+    """
+    Return free pages to the filesystem.
+
+    Databases created before incremental auto-vacuum was enabled get one full
+    VACUUM to switch modes; after that only the free pages are released.
+    """
+    conn = get_connection()
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+    else:
+        conn.execute('PRAGMA incremental_vacuum')
+
+@timed("db_write")
+def write_market_prices(date: str, bars: list[tuple]) -> None:
+    """
+    Store one day's bars, replacing any already stored for the same tickers.
+
+    Args:
+        date (str): The date the bars are stored under
+        bars (list): Tuples of (ticker, open, high, low, close, volume)
+    """
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT OR REPLACE INTO market_prices (date, ticker, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(date, *bar) for bar in bars])
+
+@timed("db_read")
+def has_market_prices(date: str) -> bool:
+    return get_connection().execute(
+        'SELECT 1 FROM market_prices WHERE date = ? LIMIT 1', (date,)
+    ).fetchone() is not None
+
+@timed("db_read")
+def read_market_price(date: str, ticker: str) -> float | None:
+    row = get_connection().execute(
+        'SELECT close FROM market_prices WHERE date = ? AND ticker = ?', (date, ticker)
+    ).fetchone()
+    return row[0] if row else None
+
+@timed("db_read")
+def read_market_prices(date: str, tickers: list[str] | None = None) -> dict[str, float]:
+    """
+    Read closing prices for a date.
+
+    Args:
+        date (str): The date the bars are stored under
+        tickers (list | None): Tickers to read, or None for every ticker on that date
+
+    Returns:
+        dict: Ticker to close, for the tickers that have a bar
+    """
+    conn = get_connection()
+    if tickers is None:
+        rows = conn.execute('SELECT ticker, close FROM market_prices WHERE date = ?', (date,))
+    else:
+        placeholders = ", ".join("?" for _ in tickers)
+        rows = conn.execute(
+            f'SELECT ticker, close FROM market_prices WHERE date = ? AND ticker IN ({placeholders})',
+            (date, *tickers),
+        )
+    return dict(rows.fetchall())
+
+@timed("db_read")
+def read_market_bars(
+    start: str | None = None,
+    end: str | None = None,
+    tickers: list[str] | None = None,
+) -> list[tuple[str, str, float]]:
+    """
+    Read stored closes over a range of dates, for replaying them offline.
+
+    Args:
+        start (str | None): The first date to read, or None for the earliest stored
+        end (str | None): The last date to read, or None for the latest stored
+        tickers (list | None): Tickers to read, or None for every ticker
+
+    Returns:
+        list: (date, ticker, close) tuples ordered by date, skipping bars with no close
+    """
+    clauses, params = ['close IS NOT NULL'], []
+    if start is not None:
+        clauses.append('date >= ?')
+        params.append(start)
+    if end is not None:
+        clauses.append('date <= ?')
+        params.append(end)
+    if tickers is not None:
+        clauses.append(f'ticker IN ({", ".join("?" for _ in tickers)})')
+        params.extend(tickers)
+    return get_connection().execute(
+        f'SELECT date, ticker, close FROM market_prices WHERE {" AND ".join(clauses)} ORDER BY date',
+        params,
+    ).fetchall()
+
+@timed("db_write")
+def write_quotes(prices: dict[str, float], fetched_at: float) -> None:
+    """
+    Publish freshly fetched share prices for other processes to reuse.
+
+    Args:
+        prices (dict): Symbol to price
+        fetched_at (float): Unix time at which the prices were fetched
+    """
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO quotes (symbol, price, fetched_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(symbol) DO UPDATE SET price=excluded.price, fetched_at=excluded.fetched_at
+            WHERE excluded.fetched_at > quotes.fetched_at
+        ''', [(symbol, price, fetched_at) for symbol, price in prices.items()])
+
+@timed("db_read")
+def read_quotes(symbols: list[str]) -> dict[str, tuple[float, float]]:
+    """Return {symbol: (price, fetched_at)} for the symbols that have a shared quote."""
+    if not symbols:
+        return {}
+    placeholders = ", ".join("?" for _ in symbols)
+    rows = get_connection().execute(
+        f'SELECT symbol, price, fetched_at FROM quotes WHERE symbol IN ({placeholders})', symbols
+    ).fetchall()
+    return {symbol: (price, fetched_at) for symbol, price, fetched_at in rows}
+
+@timed("db_write")
+def write_traders(traders: list[dict]) -> None:
+    """
+    Add or update traders, matched by name.
+
+    Args:
+        traders (list): Dicts with name, lastname, model_name, short_model_name,
+            strategy and enabled
+    """
+    with transaction() as conn:
+        conn.executemany('''
+            INSERT INTO traders (name, lastname, model_name, short_model_name, strategy, enabled)
+            VALUES (:name, :lastname, :model_name, :short_model_name, :strategy, :enabled)
+            ON CONFLICT(name) DO UPDATE SET lastname=excluded.lastname, model_name=excluded.model_name,
+                short_model_name=excluded.short_model_name, strategy=excluded.strategy, enabled=excluded.enabled
+        ''', [{**trader, "enabled": int(trader.get("enabled", True))} for trader in traders])
+
+@timed("db_read")
+def read_traders(enabled_only: bool = True) -> list[dict]:
+    """Return the traders, in the order they were added, as dicts like those write_traders takes."""
+    where = "WHERE enabled" if enabled_only else ""
+    rows = get_connection().execute(f'''
+        SELECT name, lastname, model_name, short_model_name, strategy, enabled
+        FROM traders {where} ORDER BY rowid
+    ''').fetchall()
+    return [
+        {"name": name, "lastname": lastname, "model_name": model_name,
+         "short_model_name": short_model_name, "strategy": strategy, "enabled": bool(enabled)}
+        for name, lastname, model_name, short_model_name, strategy, enabled in rows
+    ]
+
+@timed("db_write")
+def add_trader_usage(name: str, seconds: float, input_tokens: int, output_tokens: int, cost: float) -> None:
+    """Add one run's duration, tokens and estimated cost to the trader's total for today."""
+    get_connection().execute('''
+        INSERT INTO trader_usage (name, date, runs, seconds, input_tokens, output_tokens, cost)
+        VALUES (?, date('now'), 1, ?, ?, ?, ?)
+        ON CONFLICT(name, date) DO UPDATE SET runs=runs + 1, seconds=seconds + excluded.seconds,
+            input_tokens=input_tokens + excluded.input_tokens,
+            output_tokens=output_tokens + excluded.output_tokens, cost=cost + excluded.cost
+    ''', (name.lower(), seconds, input_tokens, output_tokens, cost))
+
+@timed("db_read")
+def read_trader_usage(since: str = "0000-01-01") -> dict[str, dict]:
+    """Return {name: {runs, seconds, input_tokens, output_tokens, cost}} summed over the days from since."""
+    rows = get_connection().execute('''
+        SELECT name, SUM(runs), SUM(seconds), SUM(input_tokens), SUM(output_tokens), SUM(cost)
+        FROM trader_usage WHERE date >= ? GROUP BY name
+    ''', (since,)).fetchall()
+    return {
+        name: {"runs": runs, "seconds": seconds, "input_tokens": input_tokens,
+               "output_tokens": output_tokens, "cost": cost}
+        for name, runs, seconds, input_tokens, output_tokens, cost in rows
+    }
+
+@timed("db_read")
+def read_leaderboard() -> list[tuple]:
+    """Return (name, balance, net_invested, latest value) for every account, in one query."""
+    return get_connection().execute('''
+        SELECT a.name, a.balance, a.net_invested, pv.value
+        FROM accounts a
+        LEFT JOIN portfolio_values pv
+            ON pv.id = (SELECT MAX(id) FROM portfolio_values WHERE name = a.name)
+    ''').fetchall()
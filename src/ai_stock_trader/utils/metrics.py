@@ -0,0 +1,213 @@
+"""
+In-process metrics for the hot paths.
+
+Durations are recorded per stage (price fetches, database reads and writes, MCP
+tool calls and server startups, model generations, trader runs), each series
+keyed by its stage and labels such as the model or tool. A series keeps a count,
+a running sum and the most recent METRICS_WINDOW samples, from which p50 and p99
+are computed on demand; counters (tokens used) only keep a total.
+
+Everything is exported in the Prometheus text format, served over HTTP on
+METRICS_PORT when that is set, and summarised in one line that the trading floor
+writes to the logs every METRICS_SUMMARY_INTERVAL_MINUTES. Recording is a
+perf_counter call and an append under a lock, cheap enough for every database call.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+# Port for the Prometheus endpoint; 0 leaves it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_SUMMARY_INTERVAL_MINUTES = float(os.getenv("METRICS_SUMMARY_INTERVAL_MINUTES", "60"))
+
+METRIC_PREFIX = "ai_stock_trader"
+QUANTILES = (0.5, 0.99)
+
+
+class Series:
+    """ The durations observed for one stage and set of labels. """
+
+    def __init__(self, window: int = METRICS_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.recent: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.recent.append(seconds)
+
+    def quantiles(self) -> dict[float, float]:
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+_series: dict[tuple[str, tuple], Series] = {}
+_counters: dict[tuple[str, tuple], float] = {}
+_registry_lock = threading.Lock()
+_last_summary = time.monotonic()
+
+
+def _key(name: str, labels: dict) -> tuple[str, tuple]:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def observe(stage: str, seconds: float, **labels) -> None:
+    """ Record one duration for a stage. """
+    key = _key(stage, labels)
+    series = _series.get(key)
+    if series is None:
+        with _registry_lock:
+            series = _series.setdefault(key, Series())
+    series.observe(seconds)
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """ Add to a counter, such as tokens used. """
+    key = _key(name, labels)
+    with _registry_lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def counter(name: str, **labels) -> float:
+    """ A counter's current total, 0 if it was never added to. """
+    return _counters.get(_key(name, labels), 0)
+
+
+@contextmanager
+def timer(stage: str, **labels):
+    """ Time the body of a with block, whether or not it raises. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, **labels)
+
+
+def timed(stage: str, **labels):
+    """ Decorator form of timer, for plain and async functions; labelled op=<function name> unless labels are given. """
+    def decorator(function):
+        series_labels = labels or {"op": function.__name__}
+
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with timer(stage, **series_labels):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage, **series_labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot() -> dict[str, dict]:
+    """ Count, total seconds, p50 and p99 for every series, keyed as stage{labels}. """
+    with _registry_lock:
+        series = list(_series.items())
+    result = {}
+    for (stage, labels), values in sorted(series):
+        quantiles = values.quantiles()
+        name = stage + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+        result[name] = {
+            "count": values.count,
+            "seconds": values.total,
+            "p50": quantiles[0.5],
+            "p99": quantiles[0.99],
+        }
+    return result
+
+
+def _labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + [(key, str(value)) for key, value in extra.items()]
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """ Every series as a Prometheus summary in seconds, and every counter as a counter. """
+    with _registry_lock:
+        series = sorted(_series.items())
+        counters = sorted(_counters.items())
+    lines = []
+    for stage in sorted({stage for (stage, _), _ in series}):
+        metric = f"{METRIC_PREFIX}_{stage}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for (name, labels), values in series:
+            if name != stage:
+                continue
+            for q, value in values.quantiles().items():
+                lines.append(f"{metric}{_labels(labels, quantile=q)} {value}")
+            lines.append(f"{metric}_sum{_labels(labels)} {values.total}")
+            lines.append(f"{metric}_count{_labels(labels)} {values.count}")
+    for name in sorted({name for (name, _), _ in counters}):
+        metric = f"{METRIC_PREFIX}_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for (counter, labels), value in counters:
+            if counter == name:
+                lines.append(f"{metric}{_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def summary() -> str:
+    """ One line with the count, p50 and p99 of every series, in milliseconds. """
+    return "; ".join(
+        f"{name} n={values['count']} p50={values['p50'] * 1000:.1f}ms p99={values['p99'] * 1000:.1f}ms"
+        for name, values in snapshot().items()
+    )
+
+
+def summary_if_due(interval_minutes: float = METRICS_SUMMARY_INTERVAL_MINUTES) -> str | None:
+    """ The summary, if interval_minutes have passed since it was last taken. """
+    global _last_summary
+    now = time.monotonic()
+    if now - _last_summary < interval_minutes * 60 or not _series:
+        return None
+    _last_summary = now
+    return summary()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> ThreadingHTTPServer | None:
+    """ Serve /metrics on a background thread, unless port is 0. """
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"Serving metrics on port {port}")
+    return server
@@ -0,0 +1,106 @@
+"""
+Retention for the logs table.
+
+Log rows older than a trader's TTL, or beyond its row cap, are moved out of the
+database into gzipped JSONL archives (one file per day, appended to), and the
+freed pages are handed back to the filesystem with incremental vacuum. This keeps
+the hot table small so the tracer's inserts and the dashboard's reads stay fast.
+
+Run it from the command line with `python retention.py`; the trading floor also
+calls `compact_logs_if_due` between cycles.
+"""
+
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+from database import (
+    read_log_names,
+    read_logs_through,
+    last_log_id_to_archive,
+    delete_logs_through,
+    vacuum,
+)
+
+load_dotenv(override=True)
+
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "7"))
+LOG_MAX_ROWS_PER_TRADER = int(os.getenv("LOG_MAX_ROWS_PER_TRADER", "10000"))
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", "./logs/archive")
+LOG_COMPACTION_INTERVAL_MINUTES = float(os.getenv("LOG_COMPACTION_INTERVAL_MINUTES", "60"))
+# Per-trader overrides as JSON, e.g. {"warren": {"days": 30, "max_rows": 50000}}
+LOG_RETENTION_OVERRIDES = json.loads(os.getenv("LOG_RETENTION_OVERRIDES", "{}"))
+
+ARCHIVE_BATCH_SIZE = 5000
+
+
+@dataclass
+class RetentionPolicy:
+    days: float = LOG_RETENTION_DAYS
+    max_rows: int = LOG_MAX_ROWS_PER_TRADER
+
+
+def get_policy(name: str) -> RetentionPolicy:
+    return RetentionPolicy(**LOG_RETENTION_OVERRIDES.get(name.lower(), {}))
+
+
+def archive_rows(rows: list[tuple], archive_dir: str = LOG_ARCHIVE_DIR) -> None:
+    """Append log rows to the gzipped JSONL archive for the day each was written."""
+    by_day: dict[str, list[tuple]] = {}
+    for row in rows:
+        by_day.setdefault(row[2][:10], []).append(row)
+    Path(archive_dir).mkdir(parents=True, exist_ok=True)
+    for day, day_rows in by_day.items():
+        # Appending in "at" mode adds a gzip member; readers see one continuous stream
+        with gzip.open(Path(archive_dir) / f"logs-{day}.jsonl.gz", "at", encoding="utf-8") as f:
+            for log_id, name, when, type, message in day_rows:
+                f.write(json.dumps({"id": log_id, "name": name, "datetime": when, "type": type, "message": message}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def compact_logs(archive_dir: str = LOG_ARCHIVE_DIR) -> int:
+    """
+    Archive and delete every log row that falls outside its trader's retention policy.
+
+    Rows are archived before they are deleted, so an interrupted run can at worst
+    archive a batch twice, never lose it.
+
+    Returns:
+        int: The number of rows moved to the archive
+    """
+    moved = 0
+    for name in read_log_names():
+        policy = get_policy(name)
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=policy.days)).strftime("%Y-%m-%d %H:%M:%S")
+        through_id = last_log_id_to_archive(name, cutoff, policy.max_rows)
+        while through_id:
+            rows = read_logs_through(name, through_id, ARCHIVE_BATCH_SIZE)
+            if not rows:
+                break
+            archive_rows(rows, archive_dir)
+            delete_logs_through(name, rows[-1][0])
+            moved += len(rows)
+    if moved:
+        vacuum()
+    return moved
+
+
+_last_compaction: float | None = None
+
+
+def compact_logs_if_due() -> int:
+    """Run compact_logs if LOG_COMPACTION_INTERVAL_MINUTES have passed since the last run."""
+    global _last_compaction
+    if _last_compaction is not None and time.monotonic() - _last_compaction < LOG_COMPACTION_INTERVAL_MINUTES * 60:
+        return 0
+    _last_compaction = time.monotonic()
+    return compact_logs()
+
+
+if __name__ == "__main__":
+    print(f"Archived {compact_logs()} log rows to {LOG_ARCHIVE_DIR}")
@@ -0,0 +1,53 @@
+"""
+Portfolio value history at a chosen resolution.
+
+Every valuation point is stored raw and rolled up into fixed-width minute, hour
+and day buckets as it is written (see database._append_history). Only the most
+recent PORTFOLIO_VALUES_MAX_RAW_POINTS raw points are kept, while the rollups
+hold one row per bucket, so history grows with elapsed time rather than with how
+often accounts are read. Charts ask for a window and a point budget and get the
+finest resolution that fits it, which keeps rendering cost flat as history grows.
+"""
+
+import os
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from database import read_portfolio_values, count_portfolio_values, ROLLUP_RESOLUTIONS
+
+load_dotenv(override=True)
+
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+
+RESOLUTIONS = ["raw", *ROLLUP_RESOLUTIONS]
+
+
+def choose_resolution(name: str, since: str | None, max_points: int) -> str:
+    """Return the finest rollup resolution with at most max_points points since `since`."""
+    for resolution in ROLLUP_RESOLUTIONS:
+        if count_portfolio_values(name, resolution, since) <= max_points:
+            return resolution
+    return list(ROLLUP_RESOLUTIONS)[-1]
+
+
+def get_portfolio_value_series(
+    name: str,
+    resolution: str = "auto",
+    window: timedelta | None = None,
+    max_points: int = CHART_MAX_POINTS,
+) -> list[tuple[str, float]]:
+    """
+    Return an account's (datetime, value) points, oldest first.
+
+    Args:
+        name: The account name
+        resolution: "raw", "minute", "hour", "day", or "auto" to pick the finest
+            rollup with at most max_points points in the window
+        window: How far back to go from now; the whole history if None
+        max_points: The most points to return; the oldest are dropped beyond it
+    """
+    if resolution not in RESOLUTIONS and resolution != "auto":
+        raise ValueError(f"Unknown resolution {resolution}; expected auto or one of {RESOLUTIONS}")
+    since = (datetime.now() - window).strftime("%Y-%m-%d %H:%M:%S") if window else None
+    if resolution == "auto":
+        resolution = choose_resolution(name, since, max_points)
+    return read_portfolio_values(name, resolution, since)[-max_points:]
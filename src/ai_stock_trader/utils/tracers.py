@@ -1,39 +1,171 @@
 from agents import TracingProcessor, Trace, Span
-from database import write_log
+from database import write_logs
+from metrics import observe, count
+from datetime import datetime
+from dotenv import load_dotenv
+import os
+import logging
+import queue
 import secrets
 import string
+import threading
+
+load_dotenv(override=True)
+
+logger = logging.getLogger("ai_stock_trader.tracers")
 
 ALPHANUM = string.ascii_lowercase + string.digits 
 
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+LOG_QUEUE_SIZE = 10_000
+
+# Tagged trace ids start with this, which the SDK's own (hex) trace ids never do
+TRACE_TAG_MARKER = "x"
+# Leaves at least five random characters in the 32 after 'trace_'
+MAX_TRACE_TAG_LENGTH = 24
+
 def make_trace_id(tag: str) -> str:
     """
-    Return a string of the form 'trace_<tag><random>',
-    where the total length after 'trace_' is 32 chars.
+    Return a string of the form 'trace_x<NN><tag><random>', where NN is the length
+    of the tag and the total length after 'trace_' is 32 chars. The tag must be
+    lowercase letters and digits, at most MAX_TRACE_TAG_LENGTH of them.
+    """
+    if not tag or len(tag) > MAX_TRACE_TAG_LENGTH or any(c not in ALPHANUM for c in tag):
+        raise ValueError(f"Cannot tag a trace id with {tag!r}")
+    prefix = f"{TRACE_TAG_MARKER}{len(tag):02d}{tag}"
+    random_suffix = ''.join(secrets.choice(ALPHANUM) for _ in range(32 - len(prefix)))
+    return f"trace_{prefix}{random_suffix}"
+
+def trace_tag(trace_id: str) -> str | None:
+    """ Return the tag make_trace_id put in a trace id, or None if it has none. """
+    body = trace_id.removeprefix("trace_")
+    if not body.startswith(TRACE_TAG_MARKER) or not body[1:3].isdigit():
+        return None
+    return body[3:3 + int(body[1:3])]
+
+class LogWriter:
     """
-    tag += "0"
-    pad_len = 32 - len(tag)
-    random_suffix = ''.join(secrets.choice(ALPHANUM) for _ in range(pad_len))
-    return f"trace_{tag}{random_suffix}"
+    Buffers log entries in memory and writes them to the logs table in batches.
+
+    write() only enqueues, so callers on the event loop never touch SQLite or
+    wait: if the writer has fallen a full queue behind, the entry is dropped and
+    counted in the log_entries_dropped metric. A background thread flushes the
+    queue with a single executemany every `flush_interval` seconds, or sooner once
+    `batch_size` entries are waiting; a batch that fails is retried once.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = LOG_BATCH_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL_SECONDS,
+        max_queue_size: int = LOG_QUEUE_SIZE,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, name: str, type: str, message: str) -> None:
+        try:
+            self._queue.put_nowait((name, type, message))
+        except queue.Full:
+            count("log_entries_dropped", reason="queue_full")
+            return
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> None:
+        """Write every entry queued so far, returning once they are in the database."""
+        with self._flush_lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                for attempt in range(2):
+                    try:
+                        write_logs(batch)
+                        break
+                    except Exception as e:
+                        if attempt:
+                            count("log_entries_dropped", len(batch), reason="write_failed")
+                            logger.error(f"Failed to write {len(batch)} log entries: {e}")
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def shutdown(self) -> None:
+        """Stop the background thread and drain anything still queued."""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
+
+
+def record_span_metrics(span: Span, trader: str | None = None) -> None:
+    """ Time model generations and tool calls from their spans, and count the tokens used, per trader if given. """
+    data = span.span_data
+    if not data or not span.started_at or not span.ended_at:
+        return
+    seconds = (datetime.fromisoformat(span.ended_at) - datetime.fromisoformat(span.started_at)).total_seconds()
+    if data.type == "generation":
+        # Chat Completions models
+        model = data.model or "unknown"
+        usage = data.usage or {}
+        input_tokens, output_tokens = usage.get("input_tokens"), usage.get("output_tokens")
+    elif data.type == "response":
+        # Responses API models
+        response = data.response
+        model = response.model if response else "unknown"
+        usage = response.usage if response else None
+        input_tokens = usage.input_tokens if usage else None
+        output_tokens = usage.output_tokens if usage else None
+    elif data.type == "function":
+        stage = "mcp_tool_call" if getattr(data, "mcp_data", None) else "tool_call"
+        observe(stage, seconds, tool=data.name)
+        return
+    elif data.type == "mcp_tools":
+        observe("mcp_list_tools", seconds, server=data.server)
+        return
+    else:
+        return
+    observe("generation", seconds, model=model)
+    count("tokens", input_tokens or 0, model=model, kind="input")
+    count("tokens", output_tokens or 0, model=model, kind="output")
+    if trader:
+        count("trader_tokens", input_tokens or 0, trader=trader, kind="input")
+        count("trader_tokens", output_tokens or 0, trader=trader, kind="output")
+
 
 class LogTracer(TracingProcessor):
 
+    def __init__(self, writer: LogWriter | None = None):
+        self.writer = writer or LogWriter()
+
     def get_name(self, trace_or_span: Trace | Span) -> str | None:
-        trace_id = trace_or_span.trace_id
-        name = trace_id.split("_")[1]
-        if '0' in name:
-            return name.split("0")[0]
-        else:
-            return None
+        return trace_tag(trace_or_span.trace_id)
 
     def on_trace_start(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Started: {trace.name}")
+            self.writer.write(name, "trace", f"Started: {trace.name}")
 
     def on_trace_end(self, trace) -> None:
         name = self.get_name(trace)
         if name:
-            write_log(name, "trace", f"Ended: {trace.name}")
+            self.writer.write(name, "trace", f"Ended: {trace.name}")
 
     def on_span_start(self, span) -> None:
         name = self.get_name(span)
@@ -49,10 +181,11 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.write(name, type, message)
 
     def on_span_end(self, span) -> None:
         name = self.get_name(span)
+        record_span_metrics(span, name)
         type = span.span_data.type if span.span_data else "span"
         if name:
             message = "Ended"
@@ -66,10 +199,10 @@ class LogTracer(TracingProcessor):
                     message += f" {span.span_data.server}"
             if span.error:
                 message += f" {span.error}"
-            write_log(name, type, message)
+            self.writer.write(name, type, message)
 
     def force_flush(self) -> None:
-        pass
+        self.writer.flush()
 
     def shutdown(self) -> None:
-        pass
\ No newline at end of file
+        self.writer.shutdown()
\ No newline at end of file
@@ -1,10 +1,21 @@
+import os
+from datetime import date
 import gradio as gr
 from ..utils.helpers import css, js, Color
 import pandas as pd
-from ..core.trading_floor import names, lastnames, short_model_names
+import threading
+from collections import deque
+from ..config.roster import load_roster
 import plotly.express as px
-from ..accounts.account import Account
-from ..utils.database import read_log
+from ..accounts.service import account_service
+from ..utils.database import read_log_since, read_leaderboard, read_trader_usage
+from ..utils.timeseries import get_portfolio_value_series
+
+LOG_LINES = 13
+# Traders shown in full, DASHBOARD_COLUMNS to a row; the leaderboard lists every trader
+DASHBOARD_TRADERS = int(os.getenv("DASHBOARD_TRADERS", "4"))
+DASHBOARD_COLUMNS = int(os.getenv("DASHBOARD_COLUMNS", "4"))
+LEADERBOARD_HEADERS = ["Trader", "Model", "Value", "P&L", "Runs Today", "Avg Run (s)", "Cost Today ($)"]
 
 mapper = {
     "trace": Color.WHITE,
@@ -21,10 +32,15 @@ class Trader:
         self.name = name
         self.lastname = lastname
         self.model_name = model_name
-        self.account = Account.get(name)
+        self.account = account_service.get_account(name)
+        # Rendered log lines and the id of the newest one, so each poll only reads new rows
+        self.log_lines = deque(maxlen=LOG_LINES)
+        self.last_log_id = 0
+        self.log_html = None
+        self.log_lock = threading.Lock()
 
     def reload(self):
-        self.account = Account.get(self.name)
+        self.account = account_service.get_account(self.name)
 
     def get_title(self) -> str:
         return f"<div style='text-align: center;font-size:34px;'>{self.name}<span style='color:#ccc;font-size:24px;'> ({self.model_name}) - {self.lastname}</span></div>"
@@ -33,7 +49,8 @@ class Trader:
         return self.account.get_strategy()
 
     def get_portfolio_value_df(self) -> pd.DataFrame:
-        df = pd.DataFrame(self.account.portfolio_value_time_series, columns=["datetime", "value"])
+        # A bounded number of points, downsampled as needed, however long the history
+        df = pd.DataFrame(get_portfolio_value_series(self.name), columns=["datetime", "value"])
         df["datetime"] = pd.to_datetime(df["datetime"])
         return df
 
@@ -81,13 +98,16 @@ class Trader:
         return f"<div style='text-align: center;background-color:{color};'><span style='font-size:32px'>${portfolio_value:,.0f}</span><span style='font-size:24px'>&nbsp;&nbsp;&nbsp;{emoji}&nbsp;${pnl:,.0f}</span></div>"
 
     def get_logs(self, previous=None) -> str:
-        logs = read_log(self.name, last_n=13)
-        response = ""
-        for log in logs:
-            timestamp, type, message = log
-            color = mapper.get(type, Color.WHITE).value
-            response += f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>"
-        response = f"<div style='height:250px; overflow-y:auto;'>{response}</div>"
+        with self.log_lock:
+            logs = read_log_since(self.name, self.last_log_id, last_n=LOG_LINES)
+            for log in logs:
+                log_id, timestamp, type, message = log
+                color = mapper.get(type, Color.WHITE).value
+                self.log_lines.append(f"<span style='color:{color}'>{timestamp} : [{type}] {message}</span><br/>")
+                self.last_log_id = log_id
+            if logs or self.log_html is None:
+                self.log_html = f"<div style='height:250px; overflow-y:auto;'>{''.join(self.log_lines)}</div>"
+            response = self.log_html
         if response != previous:
             return response
         return gr.update()
@@ -165,22 +185,62 @@ class TraderView:
         )
 
 
+def get_leaderboard_df(roster) -> pd.DataFrame:
+    """Every trader's value, P&L and usage today, from two queries however many traders there are"""
+    accounts = {name: (balance, net_invested, value) for name, balance, net_invested, value in read_leaderboard()}
+    usage = read_trader_usage(since=date.today().isoformat())
+    rows = []
+    for trader in roster:
+        balance, net_invested, value = accounts.get(trader.name.lower(), (None, None, None))
+        runs = usage.get(trader.name.lower(), {})
+        rows.append({
+            "Trader": trader.name,
+            "Model": trader.short_model_name,
+            "Value": round(value) if value is not None else None,
+            "P&L": round(value - net_invested - balance) if None not in (value, net_invested, balance) else None,
+            "Runs Today": runs.get("runs", 0),
+            "Avg Run (s)": round(runs["seconds"] / runs["runs"]) if runs.get("runs") else None,
+            "Cost Today ($)": round(runs.get("cost", 0.0), 4),
+        })
+    df = pd.DataFrame(rows, columns=LEADERBOARD_HEADERS)
+    return df.sort_values("Value", ascending=False, na_position="last")
+
+
 # Main UI construction
 def create_ui():
     """Create the main Gradio UI for the trading simulation"""
 
+    roster = load_roster()
     traders = [
-        Trader(trader_name, lastname, model_name)
-        for trader_name, lastname, model_name in zip(names, lastnames, short_model_names)
+        Trader(trader.name, trader.lastname, trader.short_model_name)
+        for trader in roster[:DASHBOARD_TRADERS]
     ]
     trader_views = [TraderView(trader) for trader in traders]
 
     with gr.Blocks(
         title="Traders", css=css, js=js, theme=gr.themes.Default(primary_hue="sky"), fill_width=True
     ) as ui:
+        for start in range(0, len(trader_views), DASHBOARD_COLUMNS):
+            with gr.Row():
+                for trader_view in trader_views[start:start + DASHBOARD_COLUMNS]:
+                    trader_view.make_ui()
         with gr.Row():
-            for trader_view in trader_views:
-                trader_view.make_ui()
+            leaderboard = gr.Dataframe(
+                value=lambda: get_leaderboard_df(roster),
+                label="Leaderboard",
+                headers=LEADERBOARD_HEADERS,
+                row_count=(10, "dynamic"),
+                col_count=len(LEADERBOARD_HEADERS),
+                max_height=600,
+            )
+        timer = gr.Timer(value=120)
+        timer.tick(
+            fn=lambda: get_leaderboard_df(roster),
+            inputs=[],
+            outputs=[leaderboard],
+            show_progress="hidden",
+            queue=False,
+        )
 
     return ui
 
@@ -0,0 +1,21 @@
+"""
+Shared setup for the tests.
+
+The database lives at the relative path accounts.db and is created when the
+database module is imported, so the tests move to a scratch working directory
+before any test module is collected; tests that write accounts, traders or logs
+never touch the database of the directory pytest was started from.
+"""
+
+import os
+import shutil
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="ai-stock-trader-tests-")
+_start_dir = os.getcwd()
+os.chdir(TEST_DIR)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    os.chdir(_start_dir)
+    shutil.rmtree(TEST_DIR, ignore_errors=True)
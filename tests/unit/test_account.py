@@ -2,10 +2,12 @@
 Unit tests for the Account class.
 """
 
+import json
 import pytest
 from unittest.mock import patch, MagicMock
 from datetime import datetime
 
+from ai_stock_trader.accounts import account as account_module
 from ai_stock_trader.accounts.account import Account, Transaction
 
 
@@ -81,7 +83,9 @@ class TestAccount:
             "strategy": "conservative",
             "holdings": {"AAPL": 10},
             "transactions": [],
-            "portfolio_value_time_series": []
+            "portfolio_value_time_series": [],
+            "net_invested": 1500.0,
+            "positions": {"AAPL": {"quantity": 10, "cost_basis": 1500.0, "realized_pnl": 0.0}}
         }
         mock_read.return_value = existing_data
         
@@ -93,7 +97,7 @@ class TestAccount:
         assert account.holdings == {"AAPL": 10}
         mock_write.assert_not_called()
     
-    @patch('ai_stock_trader.accounts.account.write_account')
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
     def test_account_save(self, mock_write):
         """Test saving an account."""
         account = Account(
@@ -106,7 +110,57 @@ class TestAccount:
         )
         
         account.save()
-        mock_write.assert_called_once_with("test_user", account.model_dump())
+        mock_write.assert_called_once_with(
+            "test_user", 10000.0, "aggressive", {}, [], [], 0.0, {}, 0, expected_version=None
+        )
+    
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    def test_account_save_appends_only_new_history(self, mock_write):
+        """Test that saving only writes history recorded since the last save."""
+        account = Account(
+            name="test_user",
+            balance=10000.0,
+            strategy="aggressive",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[("2024-01-01 10:00:00", 10000.0)]
+        )
+        account.save()
+        
+        transaction = Transaction(
+            symbol="AAPL",
+            quantity=10,
+            price=150.0,
+            timestamp="2024-01-01 11:00:00",
+            rationale="Test purchase"
+        )
+        account.transactions.append(transaction)
+        account.holdings["AAPL"] = 10
+        account.balance -= 1500.0
+        account.save()
+        
+        mock_write.assert_called_with(
+            "test_user", 8500.0, "aggressive", {"AAPL": 10}, [transaction.model_dump()], [], 0.0, {}, 0,
+            expected_version=0
+        )
+    
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.write_account')
+    def test_account_save_after_truncation_rewrites(self, mock_write, mock_write_changes):
+        """Test that dropping history falls back to a full rewrite."""
+        account = Account(
+            name="test_user",
+            balance=5000.0,
+            strategy="old_strategy",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[("2024-01-01 10:00:00", 5000.0)]
+        )
+        account.save()
+        
+        account.reset("new_strategy")
+        
+        mock_write.assert_called_once_with("test_user", account.model_dump(), expected_version=0)
     
     def test_account_reset(self):
         """Test resetting an account."""
@@ -185,6 +239,261 @@ class TestAccount:
             assert account.balance == 700.0
             mock_save.assert_called_once()
     
+    @patch('ai_stock_trader.accounts.account.get_share_prices')
+    def test_calculate_portfolio_value_uses_one_price_lookup(self, mock_prices):
+        """Test that all holdings are priced with a single batch lookup."""
+        mock_prices.return_value = {"AAPL": 150.0, "MSFT": 300.0}
+        account = Account(
+            name="test_user",
+            balance=1000.0,
+            strategy="conservative",
+            holdings={"AAPL": 2, "MSFT": 1},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+        
+        assert account.calculate_portfolio_value() == 1600.0
+        mock_prices.assert_called_once_with(["AAPL", "MSFT"])
+    
+    @patch('ai_stock_trader.accounts.account.transaction')
+    @patch('ai_stock_trader.accounts.account.write_log')
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.get_share_prices')
+    @patch('ai_stock_trader.accounts.account.get_share_price')
+    def test_buy_shares_writes_once(self, mock_price, mock_prices, mock_write, mock_log, mock_transaction):
+        """Test that a purchase and its report are saved together in one transaction."""
+        mock_price.return_value = 100.0
+        mock_prices.return_value = {"AAPL": 100.0}
+        account = Account(
+            name="test_user",
+            balance=1000.0,
+            strategy="conservative",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+
+        account.buy_shares("AAPL", 2, "Test purchase")
+
+        mock_write.assert_called_once()
+        name, balance, _, holdings, transactions, values, net_invested, positions, version = mock_write.call_args[0]
+        assert balance == pytest.approx(1000.0 - 200.0 * 1.002)
+        assert holdings == {"AAPL": 2}
+        assert len(transactions) == 1
+        assert len(values) == 1
+        assert net_invested == pytest.approx(200.0 * 1.002)
+        assert positions["AAPL"]["quantity"] == 2
+        assert version == 1
+        assert mock_log.call_count == 2
+        mock_transaction.assert_called_once()
+
+    @patch('ai_stock_trader.accounts.account.write_log')
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.get_share_price')
+    def test_failed_purchase_writes_nothing(self, mock_price, mock_write, mock_log):
+        """Test that a rejected purchase leaves the database untouched."""
+        mock_price.return_value = 100.0
+        account = Account(
+            name="test_user",
+            balance=100.0,
+            strategy="conservative",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+
+        with pytest.raises(ValueError, match="Insufficient funds"):
+            account.buy_shares("AAPL", 2, "Test purchase")
+
+        mock_write.assert_not_called()
+        mock_log.assert_not_called()
+
+    def test_positions_track_cost_basis_and_realized_pnl(self):
+        """Test that sells realize P&L against the average cost."""
+        account = Account(
+            name="test_user",
+            balance=10000.0,
+            strategy="conservative",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+        account._apply_trade("AAPL", 10, 100.0)
+        account._apply_trade("AAPL", 10, 200.0)
+        account._apply_trade("AAPL", -5, 180.0)
+
+        position = account.positions["AAPL"]
+        assert position.quantity == 15
+        assert position.average_cost() == 150.0
+        assert position.cost_basis == 2250.0
+        assert position.realized_pnl == 150.0
+        assert account.net_invested == 2100.0
+
+        breakdown = account.get_position_breakdown({"AAPL": 160.0})
+        assert breakdown["AAPL"]["unrealized_pnl"] == 150.0
+        # Total P&L is realized plus unrealized
+        account.balance -= 2100.0
+        assert account.calculate_profit_loss(account.balance + 15 * 160.0) == 300.0
+
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.read_account')
+    def test_positions_are_rebuilt_for_older_accounts(self, mock_read, mock_write):
+        """Test that an account saved without positions gets them from its history."""
+        mock_read.return_value = {
+            "name": "old_user",
+            "balance": 8500.0,
+            "strategy": "conservative",
+            "holdings": {"AAPL": 10},
+            "transactions": [{
+                "symbol": "AAPL",
+                "quantity": 10,
+                "price": 150.0,
+                "timestamp": "2024-01-01 10:00:00",
+                "rationale": "Old purchase"
+            }],
+            "portfolio_value_time_series": [],
+            "net_invested": None,
+            "positions": None
+        }
+
+        account = Account.get("old_user")
+
+        assert account.net_invested == 1500.0
+        assert account.positions["AAPL"].cost_basis == 1500.0
+        mock_write.assert_called_once()
+        assert mock_write.call_args[0][6] == 1500.0
+
+    @patch('ai_stock_trader.accounts.account.get_price_epoch', return_value=None)
+    @patch('ai_stock_trader.accounts.account.transaction')
+    @patch('ai_stock_trader.accounts.account.write_log')
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.get_share_prices')
+    def test_compact_report_is_bounded(self, mock_prices, mock_write, mock_log, mock_transaction, mock_epoch):
+        """Test that the compact report keeps only recent, truncated transactions."""
+        mock_prices.return_value = {"AAPL": 110.0}
+        account = Account(
+            name="test_user",
+            balance=5000.0,
+            strategy="conservative",
+            holdings={"AAPL": 50},
+            transactions=[
+                Transaction(
+                    symbol="AAPL",
+                    quantity=1,
+                    price=100.0,
+                    timestamp="2024-01-01 10:00:00",
+                    rationale="x" * 1000
+                )
+                for _ in range(50)
+            ],
+            portfolio_value_time_series=[]
+        )
+        account.rebuild_positions()
+
+        report = json.loads(account.report(compact=True))
+
+        assert len(report["recent_transactions"]) == 10
+        assert len(report["recent_transactions"][0]["rationale"]) == 163
+        assert report["transaction_count"] == 50
+        assert report["holdings"]["AAPL"]["average_cost"] == 100.0
+        assert report["holdings"]["AAPL"]["unrealized_pnl"] == 500.0
+        assert report["total_portfolio_value"] == 10500.0
+        assert "portfolio_value_time_series" not in report
+
+    @patch('ai_stock_trader.accounts.account.get_price_epoch')
+    @patch('ai_stock_trader.accounts.account.transaction')
+    @patch('ai_stock_trader.accounts.account.write_log')
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    @patch('ai_stock_trader.accounts.account.get_share_prices')
+    def test_report_is_cached_until_account_or_prices_change(
+        self, mock_prices, mock_write, mock_log, mock_transaction, mock_epoch
+    ):
+        """Test that reports are reused for the same account version and price epoch."""
+        mock_prices.return_value = {"AAPL": 110.0}
+        mock_epoch.return_value = 1
+        account = Account(
+            name="cached_user",
+            balance=5000.0,
+            strategy="conservative",
+            holdings={"AAPL": 10},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+
+        first = account.report()
+        assert account.report() == first
+        assert mock_prices.call_count == 1
+        assert len(account.portfolio_value_time_series) == 1
+
+        account.change_strategy("aggressive")
+        account.report()
+        assert mock_prices.call_count == 2
+
+        mock_epoch.return_value = 2
+        account.report()
+        assert mock_prices.call_count == 3
+
+    @patch('ai_stock_trader.accounts.account.write_account_changes')
+    def test_rolled_back_save_is_written_again(self, mock_write):
+        """Test that a save whose transaction rolls back is still unsaved, so the next save includes it."""
+        account = Account(
+            name="test_user",
+            balance=1000.0,
+            strategy="conservative",
+            holdings={},
+            transactions=[],
+            portfolio_value_time_series=[]
+        )
+        account._mark_saved()
+        account.transactions.append(
+            Transaction(symbol="AAPL", quantity=1, price=100.0, timestamp="2024-01-01 10:00:00", rationale="Test")
+        )
+        account.version += 1
+
+        with pytest.raises(RuntimeError):
+            with account_module.transaction():
+                account._write()
+                raise RuntimeError("A later write in the transaction failed")
+        account._write()
+
+        assert len(mock_write.call_args[0][4]) == 1
+        assert mock_write.call_args[1]["expected_version"] == 0
+        assert account._saved_version == 1
+
+    @patch('ai_stock_trader.accounts.account.get_price_epoch', return_value=1)
+    @patch('ai_stock_trader.accounts.account.get_share_prices', return_value={"AAPL": 100.0})
+    @patch('ai_stock_trader.accounts.account.get_share_price', return_value=100.0)
+    def test_failed_trade_leaves_no_cached_report(self, mock_price, mock_prices, mock_epoch):
+        """Test that a purchase lost to a conflicting write is not served from the report cache."""
+        Account.get("stale_user").reset("conservative")
+        first, second = Account.get("stale_user"), Account.get("stale_user")
+        second.change_strategy("aggressive")
+
+        with pytest.raises(account_module.StaleAccountError):
+            first.buy_shares("AAPL", 5, "Test purchase")
+
+        report = json.loads(Account.get("stale_user").report())
+        assert report["holdings"] == {}
+        assert report["balance"] == 10000.0
+
+    def test_conflicting_held_back_save_is_discarded(self, monkeypatch):
+        """Test that a held-back save another writer has overtaken is dropped rather than retried forever."""
+        Account.get("held_user").reset("conservative")
+        monkeypatch.setattr(account_module, "WRITE_BEHIND_SECONDS", 60)
+        held = Account.get("held_user")
+        held.deposit(100.0)
+        account_module._flush_timer.cancel()
+        with account_module.transaction() as conn:
+            conn.execute("UPDATE accounts SET version = version + 1 WHERE name = 'held_user'")
+
+        account_module.flush_pending_saves()
+
+        assert account_module.pending_account("held_user") is None
+        assert account_module._flush_timer is None
+        assert Account.get("held_user").balance == 10000.0
+        with pytest.raises(account_module.StaleAccountError):
+            held.deposit(100.0)
+
     def test_account_withdraw_insufficient_funds(self):
         """Test withdrawing more than available balance."""
         account = Account(
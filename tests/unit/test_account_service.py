@@ -0,0 +1,35 @@
+"""
+Unit tests for the AccountService class.
+"""
+
+import json
+from unittest.mock import patch
+
+from ai_stock_trader.accounts.account import Account, SPREAD
+from ai_stock_trader.accounts.service import AccountService
+
+
+class TestAccountService:
+    """Test the account operations offered to traders."""
+
+    @patch('ai_stock_trader.accounts.account.get_price_epoch', return_value=1)
+    @patch('ai_stock_trader.accounts.account.get_share_prices', return_value={"AAPL": 100.0})
+    @patch('ai_stock_trader.accounts.account.get_share_price', return_value=100.0)
+    def test_report_after_conflict_matches_stored_account(self, mock_price, mock_prices, mock_epoch):
+        """Test that a purchase retried after a conflict is reported once, as stored."""
+        Account.get("conflict_user").reset("conservative")
+        stale = Account.get("conflict_user")
+        stale.report()
+        Account.get("conflict_user").change_strategy("aggressive")
+        copies = iter([stale])
+        service = AccountService()
+
+        with patch.object(service, "get_account", side_effect=lambda name: next(copies, None) or Account.get(name)):
+            service.buy_shares("conflict_user", "AAPL", 5, "Test purchase")
+            report = json.loads(service.get_report("conflict_user"))
+
+        stored = Account.get("conflict_user")
+        assert stored.holdings == {"AAPL": 5}
+        assert report["holdings"]["AAPL"]["quantity"] == 5
+        assert report["balance"] == round(10000.0 - 5 * 100.0 * (1 + SPREAD), 2)
+        assert report["balance"] == round(stored.balance, 2)
@@ -0,0 +1,51 @@
+"""
+Unit tests for calling the accounts tools over either transport.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from mcp.shared.memory import create_connected_server_and_client_session
+
+from ai_stock_trader.accounts.account import Account
+from ai_stock_trader.accounts.client import accounts_client, call_accounts_tool
+from ai_stock_trader.accounts.server import mcp as accounts_mcp
+
+
+async def call_over(transport, tool_name, tool_args):
+    """Call a tool with ACCOUNTS_TRANSPORT set, the mcp transport served in memory."""
+    with patch('ai_stock_trader.accounts.client.ACCOUNTS_TRANSPORT', transport):
+        if transport == "inprocess":
+            return await call_accounts_tool(tool_name, tool_args)
+        async with create_connected_server_and_client_session(accounts_mcp._mcp_server) as session:
+            result = await session.call_tool(tool_name, tool_args)
+        with patch.object(accounts_client, "call_tool", AsyncMock(return_value=result)):
+            return await call_accounts_tool(tool_name, tool_args)
+
+
+class TestCallAccountsTool:
+    """Test that a tool returns the same value whichever transport carries it."""
+
+    @pytest.mark.parametrize("tool_name, tool_args", [
+        ("get_balance", {"name": "transport_user"}),
+        ("get_holdings", {"name": "transport_user"}),
+        ("change_strategy", {"name": "transport_user", "strategy": "conservative"}),
+    ])
+    def test_transports_return_same_value(self, tool_name, tool_args):
+        """Test that the mcp transport unwraps its result into the value the service returns."""
+        Account.get("transport_user").reset("conservative")
+
+        inprocess = asyncio.run(call_over("inprocess", tool_name, tool_args))
+        over_mcp = asyncio.run(call_over("mcp", tool_name, tool_args))
+
+        assert over_mcp == inprocess
+
+    def test_tool_error_is_raised_on_both_transports(self):
+        """Test that a failed trade raises ValueError over either transport."""
+        Account.get("transport_user").reset("conservative")
+        args = {"name": "transport_user", "symbol": "AAPL", "quantity": 10, "rationale": "Test sale"}
+
+        for transport in ["inprocess", "mcp"]:
+            with pytest.raises(ValueError, match="Not enough shares held"):
+                asyncio.run(call_over(transport, "sell_shares", args))
@@ -0,0 +1,91 @@
+"""
+Unit tests for the backtest engine.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_stock_trader.accounts.account import INITIAL_BALANCE, SPREAD, Transaction
+from ai_stock_trader.core.backtest import (
+    Backtest,
+    Bars,
+    BuyAndHold,
+    MovingAverageCrossover,
+    RecordedDecisions,
+    Strategy,
+)
+
+
+def make_bars(closes: dict[str, list[float]]) -> Bars:
+    """Build bars for consecutive days from per-ticker closes."""
+    dates = pd.date_range("2024-01-01", periods=len(next(iter(closes.values())))).strftime("%Y-%m-%d")
+    rows = [
+        (date, ticker, close)
+        for ticker, series in closes.items()
+        for date, close in zip(dates, series)
+        if close is not None
+    ]
+    return Bars.from_frame(pd.DataFrame(rows, columns=["date", "ticker", "close"]))
+
+
+class TestBacktest:
+    """Test replaying strategies over bars."""
+
+    def test_bars_are_carried_forward_over_gaps(self):
+        """Test that a missing close takes the previous one, and is NaN before the first."""
+        bars = make_bars({"AAPL": [None, 10.0, None, 12.0], "MSFT": [5.0, 6.0, 7.0, 8.0]})
+
+        assert bars.tickers == ["AAPL", "MSFT"]
+        assert np.isnan(bars.closes[0, 0])
+        assert bars.closes[2, 0] == 10.0
+
+    def test_fills_follow_account_rules(self):
+        """Test that fills use the spread and that orders Account would refuse are rejected."""
+        bars = make_bars({"AAPL": [100.0, 110.0, 120.0]})
+        strategy = RecordedDecisions([
+            Transaction(symbol="AAPL", quantity=10, price=0, timestamp="2024-01-01 10:00:00", rationale="buy"),
+            Transaction(symbol="AAPL", quantity=1000, price=0, timestamp="2024-01-02 10:00:00", rationale="too big"),
+            Transaction(symbol="AAPL", quantity=-20, price=0, timestamp="2024-01-02 11:00:00", rationale="too many"),
+            Transaction(symbol="AAPL", quantity=-10, price=0, timestamp="2024-01-03 10:00:00", rationale="sell"),
+        ])
+
+        result = Backtest(bars, strategy).run()
+
+        assert [t.price for t in result.transactions] == [
+            pytest.approx(100.0 * (1 + SPREAD)),
+            pytest.approx(120.0 * (1 - SPREAD)),
+        ]
+        assert [reason for *_, reason in result.rejected] == [
+            "Insufficient funds to buy shares.",
+            "Not enough shares of AAPL held.",
+        ]
+        cash_after_buy = INITIAL_BALANCE - 1000.0 * (1 + SPREAD)
+        assert result.values[1] == pytest.approx(cash_after_buy + 1100.0)
+        assert result.values[2] == pytest.approx(cash_after_buy + 1200.0 * (1 - SPREAD))
+
+    def test_buy_and_hold_tracks_prices(self):
+        """Test that a bought portfolio's value moves with the closes."""
+        bars = make_bars({"AAPL": [100.0, 200.0], "MSFT": [50.0, 50.0]})
+
+        result = Backtest(bars, BuyAndHold()).run()
+
+        assert result.holdings_at(-1) == {"AAPL": 49, "MSFT": 99}
+        assert result.values[1] - result.values[0] == pytest.approx(49 * 100.0)
+
+    def test_moving_average_crossover_enters_and_exits(self):
+        """Test that a crossover strategy buys on the way up and sells on the way down."""
+        bars = make_bars({"AAPL": [10.0] * 5 + [20.0] * 5 + [5.0] * 5})
+
+        result = Backtest(bars, MovingAverageCrossover(fast=2, slow=4, allocation=0.5)).run()
+
+        assert [t.quantity > 0 for t in result.transactions] == [True, False]
+        assert result.summary()["trades"] == 2
+
+    def test_strategy_without_orders_cannot_be_created(self):
+        """A strategy that does not implement orders fails when created, not during a run."""
+        class Incomplete(Strategy):
+            pass
+
+        with pytest.raises(TypeError):
+            Incomplete()
@@ -0,0 +1,60 @@
+"""
+Unit tests for the metrics module.
+"""
+
+import asyncio
+
+import pytest
+
+from ai_stock_trader.utils import metrics
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    metrics._series.clear()
+    metrics._counters.clear()
+    yield
+    metrics._series.clear()
+    metrics._counters.clear()
+
+
+class TestMetrics:
+    """Test recording and exporting metrics."""
+
+    def test_quantiles_cover_recent_samples(self):
+        """Test that p50 and p99 come from the window of recent samples."""
+        series = metrics.Series(window=100)
+        for ms in range(1, 201):
+            series.observe(ms / 1000)
+
+        assert series.count == 200
+        assert series.quantiles() == {0.5: pytest.approx(0.151), 0.99: pytest.approx(0.2)}
+
+    def test_timed_labels_by_function_name(self):
+        """Test that the decorator times plain and async functions."""
+        @metrics.timed("db_read")
+        def read():
+            return 1
+
+        @metrics.timed("price_fetch", source="polygon")
+        async def fetch():
+            return 2
+
+        assert read() == 1
+        assert asyncio.run(fetch()) == 2
+
+        snapshot = metrics.snapshot()
+        assert snapshot["db_read{op=read}"]["count"] == 1
+        assert snapshot["price_fetch{source=polygon}"]["count"] == 1
+
+    def test_prometheus_format(self):
+        """Test that series export as summaries and counters as totals."""
+        metrics.observe("generation", 0.5, model="gpt-4o-mini")
+        metrics.count("tokens", 120, model="gpt-4o-mini", kind="input")
+
+        text = metrics.render_prometheus()
+
+        assert "# TYPE ai_stock_trader_generation_seconds summary" in text
+        assert 'ai_stock_trader_generation_seconds{model="gpt-4o-mini",quantile="0.99"} 0.5' in text
+        assert 'ai_stock_trader_generation_seconds_count{model="gpt-4o-mini"} 1' in text
+        assert 'ai_stock_trader_tokens_total{kind="input",model="gpt-4o-mini"} 120' in text
@@ -0,0 +1,96 @@
+"""
+Unit tests for the QuoteCache class.
+"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock, patch
+
+from ai_stock_trader.market.quote_cache import QuoteCache
+
+
+class TestQuoteCache:
+    """Test the QuoteCache class."""
+
+    def test_fresh_prices_are_served_from_cache(self):
+        """Test that a second lookup within the TTL does not fetch."""
+        cache = QuoteCache(ttl=60)
+        fetch = MagicMock(return_value=150.0)
+
+        assert cache.get("AAPL", fetch) == 150.0
+        assert cache.get("AAPL", fetch) == 150.0
+
+        fetch.assert_called_once_with("AAPL")
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_get_many_fetches_only_misses(self):
+        """Test that a batch lookup fetches just the uncached symbols."""
+        cache = QuoteCache(ttl=60)
+        cache.put_many({"AAPL": 150.0})
+        fetch = MagicMock(return_value={"MSFT": 300.0})
+
+        prices = cache.get_many(["AAPL", "MSFT"], fetch)
+
+        assert prices == {"AAPL": 150.0, "MSFT": 300.0}
+        fetch.assert_called_once_with(["MSFT"])
+
+    @patch('ai_stock_trader.market.quote_cache.time.time')
+    def test_stale_prices_are_served_and_refreshed(self, mock_time):
+        """Test stale-while-revalidate behaviour."""
+        mock_time.return_value = 1000.0
+        cache = QuoteCache(ttl=60, stale_ttl=300)
+        cache.put_many({"AAPL": 150.0})
+        fetch = MagicMock(return_value={"AAPL": 155.0})
+
+        mock_time.return_value = 1100.0
+        assert cache.get_many(["AAPL"], fetch) == {"AAPL": 150.0}
+        cache._executor.shutdown(wait=True)
+
+        fetch.assert_called_once_with(["AAPL"])
+        assert cache.get_many(["AAPL"], fetch) == {"AAPL": 155.0}
+        assert cache.stats()["stale_hits"] == 1
+
+    @patch('ai_stock_trader.market.quote_cache.time.time')
+    def test_expired_prices_are_refetched(self, mock_time):
+        """Test that prices past the stale TTL block on a fetch."""
+        mock_time.return_value = 1000.0
+        cache = QuoteCache(ttl=60, stale_ttl=300)
+        cache.put_many({"AAPL": 150.0})
+
+        mock_time.return_value = 2000.0
+        assert cache.get("AAPL", lambda symbol: 160.0) == 160.0
+        assert cache.stats()["misses"] == 1
+
+    def test_shared_store_is_read_before_fetching(self):
+        """Test that prices published by another process are reused."""
+        shared_read = MagicMock(return_value={"AAPL": (150.0, time.time())})
+        shared_write = MagicMock()
+        cache = QuoteCache(ttl=60, shared_read=shared_read, shared_write=shared_write)
+        fetch = MagicMock(return_value={"MSFT": 300.0})
+
+        prices = cache.get_many(["AAPL", "MSFT"], fetch)
+
+        assert prices == {"AAPL": 150.0, "MSFT": 300.0}
+        fetch.assert_called_once_with(["MSFT"])
+        shared_write.assert_called_once()
+        assert shared_write.call_args[0][0] == {"MSFT": 300.0}
+        assert cache.stats()["shared_hits"] == 1
+
+    def test_least_recently_used_symbol_is_evicted(self):
+        """Test that the cache stays within max_size."""
+        cache = QuoteCache(ttl=60, max_size=2)
+        cache.put_many({"AAPL": 150.0, "MSFT": 300.0})
+        cache.get("AAPL", MagicMock())
+        cache.put_many({"GOOGL": 100.0})
+
+        assert cache.stats()["size"] == 2
+        assert cache.stats()["evictions"] == 1
+        fetch = MagicMock(return_value={"MSFT": 301.0})
+        cache.get_many(["AAPL", "MSFT"], fetch)
+        fetch.assert_called_once_with(["MSFT"])
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -0,0 +1,91 @@
+"""
+Unit tests for the trader roster.
+"""
+
+import json
+
+import pytest
+
+from ai_stock_trader.config import roster
+from ai_stock_trader.utils.database import get_connection
+from ai_stock_trader.utils.tracers import make_trace_id, trace_tag
+
+
+@pytest.fixture(autouse=True)
+def empty_roster(monkeypatch):
+    monkeypatch.setattr(roster, "TRADERS_FILE", "")
+    get_connection().execute("DELETE FROM traders")
+    yield
+    get_connection().execute("DELETE FROM traders")
+
+
+class TestRoster:
+    """Test loading the traders from the traders table."""
+
+    def test_seeds_default_traders(self):
+        """Test that an empty table is seeded with the four built-in traders, in order."""
+        traders = roster.load_roster()
+
+        assert [trader.name for trader in traders] == ["Warren", "George", "Ray", "Cathie"]
+        assert "Warren Buffett" in traders[0].strategy
+        assert traders[0].short_model_name == roster.SHORT_MODEL_NAMES[traders[0].model_name]
+
+    def test_built_in_traders_follow_use_many_models(self, monkeypatch):
+        """Test that changing USE_MANY_MODELS moves the already seeded traders onto the other models."""
+        monkeypatch.setattr(roster, "USE_MANY_MODELS", False)
+        assert {trader.model_name for trader in roster.load_roster()} == {"gpt-4o-mini"}
+
+        monkeypatch.setattr(roster, "USE_MANY_MODELS", True)
+        traders = roster.load_roster()
+
+        assert [trader.model_name for trader in traders] == [
+            "gpt-4.1-mini", "deepseek-chat", "gemini-2.5-flash-preview-04-17", "grok-3-mini-beta"
+        ]
+        assert traders[1].short_model_name == "DeepSeek V3"
+        assert "Warren Buffett" in traders[0].strategy
+
+    def test_traders_file_is_synced(self, tmp_path, monkeypatch):
+        """Test that the file's traders are upserted and disabled ones left out of the floor."""
+        path = tmp_path / "traders.json"
+        path.write_text(json.dumps([
+            {"name": "Ada", "lastname": "Quant", "model_name": "my-model", "strategy": "Momentum."},
+            {"name": "Bob", "lastname": "Value", "model_name": "gpt-4o-mini", "strategy": "Value."},
+        ]))
+        monkeypatch.setattr(roster, "TRADERS_FILE", str(path))
+        assert [trader.name for trader in roster.load_roster()] == ["Ada", "Bob"]
+
+        path.write_text(json.dumps([
+            {"name": "Ada", "lastname": "Quant", "model_name": "my-model", "strategy": "Mean reversion."},
+            {"name": "Bob", "lastname": "Value", "model_name": "gpt-4o-mini", "strategy": "Value.", "enabled": False},
+        ]))
+        traders = roster.load_roster()
+
+        assert [(trader.name, trader.strategy) for trader in traders] == [("Ada", "Mean reversion.")]
+        assert traders[0].short_model_name == "my-model"
+        assert len(roster.load_roster(include_disabled=True)) == 2
+
+    def test_name_with_zero_is_traced_exactly(self, tmp_path, monkeypatch):
+        """Test that a trader named with a "0" gets its own name back from its trace ids."""
+        path = tmp_path / "traders.json"
+        path.write_text(json.dumps([
+            {"name": "Trader1", "lastname": "One", "model_name": "gpt-4o-mini", "strategy": "Value."},
+            {"name": "Trader10", "lastname": "Ten", "model_name": "gpt-4o-mini", "strategy": "Value."},
+        ]))
+        monkeypatch.setattr(roster, "TRADERS_FILE", str(path))
+
+        names = [trader.name.lower() for trader in roster.load_roster()]
+
+        assert [trace_tag(make_trace_id(name)) for name in names] == ["trader1", "trader10"]
+        assert trace_tag("trace_" + "0" * 32) is None
+
+    @pytest.mark.parametrize("name", ["", "Ada Lovelace", "10x", "x" * 25])
+    def test_invalid_names_are_rejected(self, tmp_path, monkeypatch, name):
+        """Test that a traders file with a name that cannot be traced is rejected."""
+        path = tmp_path / "traders.json"
+        path.write_text(json.dumps([
+            {"name": name, "lastname": "Quant", "model_name": "gpt-4o-mini", "strategy": "Value."},
+        ]))
+        monkeypatch.setattr(roster, "TRADERS_FILE", str(path))
+
+        with pytest.raises(ValueError, match="trader 1"):
+            roster.load_roster()
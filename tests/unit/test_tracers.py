@@ -0,0 +1,45 @@
+"""
+Unit tests for the batching log writer.
+"""
+
+from unittest.mock import patch
+
+from ai_stock_trader.utils.tracers import LogWriter
+
+
+class TestLogWriter:
+    """Test that the log writer never blocks its callers and reports what it loses."""
+
+    @patch('ai_stock_trader.utils.tracers.count')
+    @patch('ai_stock_trader.utils.tracers.write_logs')
+    def test_full_queue_drops_entry(self, mock_write_logs, mock_count):
+        """Test that a write to a full queue returns at once and is counted as dropped."""
+        writer = LogWriter(batch_size=10, flush_interval=60, max_queue_size=1)
+        writer.write("warren", "trace", "kept")
+        writer.write("warren", "trace", "dropped")
+        writer.shutdown()
+
+        mock_write_logs.assert_called_once_with([("warren", "trace", "kept")])
+        mock_count.assert_called_once_with("log_entries_dropped", reason="queue_full")
+
+    @patch('ai_stock_trader.utils.tracers.count')
+    @patch('ai_stock_trader.utils.tracers.write_logs')
+    def test_failed_batch_is_retried_once(self, mock_write_logs, mock_count):
+        """Test that a batch is written on retry, and dropped and logged if the retry fails too."""
+        writer = LogWriter(batch_size=10, flush_interval=60)
+        mock_write_logs.side_effect = [Exception("database is locked"), None]
+        writer.write("warren", "trace", "first")
+        writer.flush()
+
+        assert mock_write_logs.call_count == 2
+        mock_count.assert_not_called()
+
+        mock_write_logs.side_effect = Exception("database is locked")
+        writer.write("warren", "trace", "second")
+        with patch('ai_stock_trader.utils.tracers.logger') as mock_logger:
+            writer.flush()
+        writer.shutdown()
+
+        assert mock_write_logs.call_count == 4
+        mock_count.assert_called_once_with("log_entries_dropped", 1, reason="write_failed")
+        mock_logger.error.assert_called_once()